@@ -1,26 +1,30 @@
-from crewai import Agent, LLM
 import os
 from dotenv import load_dotenv
-from langchain_community.embeddings import BedrockEmbeddings
 import json
 
 load_dotenv(override=True)
-# Initialize the search tool with the specified directory and model configuration
-from crewai_tools import tool
 
-import boto3
-
-region_name = "us-east-1"
-bedrock_agent_runtime = boto3.client("bedrock-agent-runtime", region_name=region_name)
-
-
-from langchain_aws import ChatBedrock
-import json
+# crewai, crewai_tools and the langchain integrations take seconds to import,
+# so they are imported where first used (main.preload() imports them once
+# in the gunicorn master)
+from clients import get_client
+from caching import TTLCache, SingleFlight
+from semantic_cache import normalize_question
+from tracing import span, record_tokens
+from context_budget import select_chunks, format_context, budget
+import deadline
+from bedrock_limiter import priority, LOW
+import hashlib
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# Set BOT_VERBOSE=false in production to stop logging full payloads/answers
+# and the verbose crew/agent output
+BOT_VERBOSE = os.getenv("BOT_VERBOSE", "true").lower() == "true"
+
 
 def generate_text(model_id, body):
     """
@@ -34,15 +38,21 @@ def generate_text(model_id, body):
 
     logger.info("Generating text with your provisioned custom model %s", model_id)
 
-    brt = boto3.client(service_name="bedrock-runtime")
+    brt = get_client("bedrock-runtime")
 
     accept = "application/json"
     content_type = "application/json"
 
-    response = brt.invoke_model(
-        body=body, modelId=model_id, accept=accept, contentType=content_type
+    with span("finetune"):
+        response = brt.invoke_model(
+            body=body, modelId=model_id, accept=accept, contentType=content_type
+        )
+        response_body = json.loads(response.get("body").read())
+    record_tokens(
+        model_id,
+        response_body.get("inputTextTokenCount"),
+        sum(r.get("tokenCount", 0) for r in response_body.get("results", [])),
     )
-    response_body = json.loads(response.get("body").read())
 
     logger.info(
         "Successfully generated text with provisioned custom model %s", model_id
@@ -65,24 +75,45 @@ def finetune(question):
     return response_body["results"][0]["outputText"]
 
 
+BUCKET_NAME = "depaimagegen"  # Replace with your S3 bucket name
+IMAGE_MODEL_ID = "amazon.titan-image-generator-v2:0"
+
+
+def s3_url(filename: str) -> str:
+    """Public URL of an object in the image bucket."""
+    return f"https://{BUCKET_NAME}.s3.amazonaws.com/{filename}"
+
+
+def s3_object_exists(filename: str) -> bool:
+    """Checks whether an object already exists in the image bucket."""
+    from botocore.exceptions import ClientError
+
+    try:
+        with span("s3_head"):
+            get_client("s3").head_object(Bucket=BUCKET_NAME, Key=filename)
+        return True
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+
 def upload_to_s3(image_data: bytes, filename: str) -> str:
     """Uploads the image directly to S3 from memory and returns the S3 URL."""
-    s3 = boto3.client("s3")
-    bucket_name = "depaimagegen"  # Replace with your S3 bucket name
+    s3 = get_client("s3")
 
     # Upload image bytes directly to S3
-    s3.put_object(
-        Bucket=bucket_name,
-        Key=filename,
-        Body=image_data,
-        ContentType="image/png",  # Change to appropriate MIME type
-        ACL="public-read",  # Make the object publicly accessible
-    )
+    with span("s3_upload"):
+        s3.put_object(
+            Bucket=BUCKET_NAME,
+            Key=filename,
+            Body=image_data,
+            ContentType="image/png",  # Change to appropriate MIME type
+            ACL="public-read",  # Make the object publicly accessible
+        )
 
     # Construct the public S3 URL for the uploaded image
-    s3_url = f"https://{bucket_name}.s3.amazonaws.com/{filename}"
-
-    return s3_url
+    return s3_url(filename)
 
 
 def clean_prompt(text: str) -> str:
@@ -108,16 +139,55 @@ def clean_prompt(text: str) -> str:
     return cleaned_text
 
 
+# Prompt hash -> S3 URL of images that were already generated
+image_index = TTLCache(
+    maxsize=int(os.getenv("IMAGE_INDEX_SIZE", "4096")),
+    ttl=float(os.getenv("IMAGE_INDEX_TTL", "604800")),
+)
+image_flight = SingleFlight()
+
+
+class ImagePending(deadline.DeadlineExceeded):
+    """
+    Raised by generate_image() when the Titan request is ready but there is
+    no time left to render it. Pass `request` to render_request() later
+    rather than generating the prompts again.
+    """
+
+    def __init__(self, request):
+        super().__init__("Not enough time left for image")
+        self.request = request
+
+
 def generate_image(text: str) -> str:
     """Generates a business overview image using Amazon Titan and uploads it to S3."""
+    from langchain_aws import ChatBedrock
+
+    # Checked before the two prompt calls too, not only before the render
+    deadline.check("image")
+
     llm = ChatBedrock(
+        client=get_client("bedrock-runtime"),
         model_id="amazon.titan-text-express-v1",
         model_kwargs=dict(temperature=0),  # Set higher temperature for creativity
     )
-    import base64
-
-    text = clean_prompt(text)
 
+    # Image calls, the prompt rewrites included, queue behind text answers
+    # when Bedrock is busy
+    with priority(LOW):
+        text = clean_prompt(text)
+        request = image_request(llm, text)
+        image_url = image_index.get(request[2])
+        if image_url is not None:
+            return image_url
+        # Rendering takes seconds; the caller pushes the image later instead
+        if not deadline.enough("image"):
+            raise ImagePending(request)
+        return render_request(request)
+
+
+def image_request(llm, text: str):
+    """The Titan image request body for a text, with its S3 object key and digest."""
     messages = [
         (
             "system",
@@ -125,9 +195,12 @@ def generate_image(text: str) -> str:
         ),
         ("human", text),
     ]
-    ai_msg = llm.invoke(messages)
+    with span("titan_prompt"):
+        ai_msg = llm.invoke(messages)
+    usage = getattr(ai_msg, "usage_metadata", None) or {}
+    record_tokens("amazon.titan-text-express-v1", usage.get("input_tokens"), usage.get("output_tokens"))
     concludeText = ai_msg.content
-    print("Image Generation Prompt:", concludeText)
+    logger.debug("Image Generation Prompt: %s", concludeText)
 
     body = json.dumps(
         {
@@ -143,37 +216,181 @@ def generate_image(text: str) -> str:
                 "cfgScale": 8,
                 # "seed": 42,
             },
-        }
+        },
+        sort_keys=True,
     )
 
-    bedrock = boto3.client(service_name="bedrock-runtime")
-    response = bedrock.invoke_model(
-        body=body,
-        modelId="amazon.titan-image-generator-v2:0",
-        accept="application/json",
-        contentType="application/json",
-    )
+    # Same prompt and config -> same object key, so repeats skip the render
+    digest = hashlib.sha256(f"{IMAGE_MODEL_ID}\n{body}".encode("utf-8")).hexdigest()
+    return body, f"generated/{digest}.png", digest
+
+
+def render_request(request) -> str:
+    """Renders (or looks up) the image of a request from image_request()."""
+    body, filename, digest = request
+    image_url = image_index.get(digest)
+    if image_url is not None:
+        return image_url
+    return image_flight.do(digest, lambda: render_image(body, filename, digest))
 
-    response_body = json.loads(response.get("body").read())
+
+def render_image(body: str, filename: str, digest: str) -> str:
+    """Renders the Titan image for a request body unless S3 already has it."""
+    import base64
+
+    if s3_object_exists(filename):
+        image_url = s3_url(filename)
+        image_index.set(digest, image_url)
+        return image_url
+
+    bedrock = get_client("bedrock-runtime")
+    with span("titan_image"):
+        response = bedrock.invoke_model(
+            body=body,
+            modelId=IMAGE_MODEL_ID,
+            accept="application/json",
+            contentType="application/json",
+        )
+        response_body = json.loads(response.get("body").read())
     base64_image = response_body.get("images")[0]
 
     # Convert base64 image to bytes for S3 upload
     image_bytes = base64.b64decode(base64_image)
 
     # Upload the image to S3 and get the URL
-    image_url = upload_to_s3(image_bytes, "generated_business_image.png")
+    image_url = upload_to_s3(image_bytes, filename)
+    image_index.set(digest, image_url)
 
     return image_url
 
 
 # print(generate_image("What is Double whopper"))
 
-from langchain_openai import ChatOpenAI
+KNOWLEDGE_BASE_ID = "ULFPGHXRLJ"
+NUMBER_OF_RESULTS = 5
+
+retrieval_cache = TTLCache(
+    maxsize=int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("RETRIEVAL_CACHE_TTL", "600")),
+)
+retrieval_flight = SingleFlight()
+
+
+def trim_results(retrieval_results):
+    """Keeps only the text, score and source of each retrieved chunk."""
+    trimmed = []
+    for item in retrieval_results:
+        location = item.get("location", {})
+        source = location.get("s3Location", {}).get("uri") or location.get(
+            "webLocation", {}
+        ).get("url")
+        trimmed.append(
+            {
+                "text": item.get("content", {}).get("text", ""),
+                "score": round(float(item.get("score", 0.0)), 4),
+                "source": source,
+            }
+        )
+    return trimmed
+
+
+# "bedrock" queries the knowledge base; "local" uses local_index over Data/
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "bedrock")
+
+
+def bedrock_retrieve(query: str):
+    with span("kb_retrieve"):
+        answer = get_client("bedrock-agent-runtime").retrieve(
+            retrievalQuery={"text": query},
+            knowledgeBaseId=KNOWLEDGE_BASE_ID,
+            retrievalConfiguration={
+                "vectorSearchConfiguration": {
+                    "numberOfResults": NUMBER_OF_RESULTS,
+                    "overrideSearchType": "HYBRID",  # optional
+                }
+            },
+        )
+    return trim_results(answer["retrievalResults"])
+
+
+def local_retrieve(query: str):
+    from local_index import get_index
+
+    with span("local_retrieve"):
+        return get_index().search(query, NUMBER_OF_RESULTS)
+
+
+def retrieve(query: str):
+    """
+    Retrieves knowledge-base chunks for a query, cached by normalized query.
+
+    Concurrent identical lookups share one in-flight retrieve call.
+
+    Returns:
+        list[dict]: Trimmed results with "text", "score" and "source".
+    """
+    key = normalize_question(query)
+    results = retrieval_cache.get(key)
+    if results is not None:
+        return results
+
+    def fetch():
+        if RETRIEVAL_BACKEND == "local":
+            trimmed = local_retrieve(query)
+        else:
+            trimmed = bedrock_retrieve(query)
+        retrieval_cache.set(key, trimmed)
+        return trimmed
+
+    return retrieval_flight.do(key, fetch)
+
+
+ANSWER_MODEL_ID = "meta.llama3-70b-instruct-v1:0"
+
+
+def answer_from_context(question: str, chunks) -> str:
+    """Answers a question from retrieved chunks in a single LLM call."""
+    context = format_context(select_chunks(chunks, budget("direct")))
+    with span("kb_direct_answer"):
+        response = get_client("bedrock-runtime").converse(
+            modelId=ANSWER_MODEL_ID,
+            system=[
+                {
+                    "text": "You are a friendly business consultant. Answer the question in at most 4 sentences "
+                    "using only the context. If the context does not answer it, say "
+                    "'Sorry, I cannot find any relevant information on this topic.'"
+                }
+            ],
+            messages=[
+                {
+                    "role": "user",
+                    "content": [{"text": f"Context:\n{context}\n\nQuestion: {question}"}],
+                }
+            ],
+            inferenceConfig={"maxTokens": 400, "temperature": 0},
+        )
+    usage = response.get("usage", {})
+    record_tokens(ANSWER_MODEL_ID, usage.get("inputTokens"), usage.get("outputTokens"))
+    return response["output"]["message"]["content"][0]["text"].strip()
+
+
+# Passages the tools returned to the crew running on this thread, which the
+# answer is graded against (see groundedness.py)
+_evidence = threading.local()
+
 
-os.environ["GROQ_API_KEY"] = os.getenv("GROQ_API_KEY")
+def collect_evidence():
+    """Starts a new evidence list for this thread and returns it."""
+    _evidence.texts = []
+    return _evidence.texts
+
+
+def add_evidence(texts):
+    collected = getattr(_evidence, "texts", None)
+    if collected is not None:
+        collected.extend(texts)
 
 
-@tool("Business Consultant tools")
 def ask_expert(question: str) -> str:
     """
     This tool uses AWS Bedrock to retrieve and generate answers from a knowledge base.
@@ -182,31 +399,78 @@ def ask_expert(question: str) -> str:
     - question (str): The question you want to ask the expert.
 
     Returns:
-    - str: The generated response from the model.
+    - str: The most relevant distinct passages, numbered, with their source.
     """
-    kbId = "ULFPGHXRLJ"
-    query = question
-    answer = bedrock_agent_runtime.retrieve(
-        retrievalQuery={"text": query},
-        knowledgeBaseId=kbId,
-        retrievalConfiguration={
-            "vectorSearchConfiguration": {
-                "numberOfResults": 5,
-                "overrideSearchType": "HYBRID",  # optional
-            }
+    if not deadline.enough("retrieve"):
+        deadline.degraded("retrieve_skipped")
+        return "Out of time: answer now with the information you already have."
+    # Ranked, deduplicated and trimmed to the research context budget
+    chunks = select_chunks(retrieve(question), budget("research"))
+    add_evidence(chunk["text"] for chunk in chunks)
+    return format_context(chunks) or "No relevant passages found."
+
+
+def ask_menu(query: str) -> str:
+    """
+    Exact numbers from the Burger King menu and the nutrition table.
+
+    Use it for calories, protein, fat, sodium, sugar or carbs of a named item
+    (e.g. "calories in a Double Whopper") or to filter items by a nutrient
+    (e.g. "burgers under 500 kcal", "more than 40g protein").
+
+    Parameters:
+    - query (str): The item name or filter to look up.
+
+    Returns:
+    - str: Matching rows as JSON, or a note that nothing matched.
+    """
+    from menu_db import get_database
+
+    rows = get_database().query(query)
+    if not rows:
+        return "No matching menu or nutrition items found."
+    for row in rows:
+        row.pop("name_key", None)
+    rows = json.dumps(rows, ensure_ascii=False)
+    add_evidence([rows])
+    return rows
+
+
+_crew_tools = None
+
+
+def crew_tools():
+    """ask_expert and ask_menu wrapped as crewai tools."""
+    global _crew_tools
+    if _crew_tools is None:
+        from crewai_tools import tool
+
+        _crew_tools = [
+            tool("Business Consultant tools")(ask_expert),
+            tool("Menu and nutrition lookup")(ask_menu),
+        ]
+    return _crew_tools
+
+
+def build_embeddings():
+    """Titan text v2 embeddings (1024-d) on the shared bedrock-runtime client."""
+    from langchain_community.embeddings import BedrockEmbeddings
+
+    return BedrockEmbeddings(
+        client=get_client("bedrock-runtime"),
+        model_id="amazon.titan-embed-text-v2:0",
+        model_kwargs={
+            "dimensions": 1024,
         },
     )
 
-    # Return the generated answer text
-    return answer["retrievalResults"]
-
 
 class ResearchCrewAgents:
 
     def __init__(self):
-        bedrock_client = boto3.client(
-            service_name="bedrock-runtime", region_name="us-east-1"
-        )
+        from crewai import LLM
+
+        bedrock_client = get_client("bedrock-runtime")
 
         # Create LLM instance for CrewAI
         self.selected_llm = LLM(
@@ -218,14 +482,11 @@ class ResearchCrewAgents:
         )
 
         """Embedded"""
-        self.embeddings = BedrockEmbeddings(
-            model_id="amazon.titan-embed-text-v2:0",
-            model_kwargs={
-                "dimensions": 1024,
-            },
-        )
+        self.embeddings = build_embeddings()
 
     def researcher(self):
+        from crewai import Agent
+
         # Setup the tool for the Researcher agent
         return Agent(
             role="Research Agent",
@@ -236,14 +497,16 @@ class ResearchCrewAgents:
                 "Provide a clear and concise answer."
                 "Do not remove technical terms that are important for the answer, as this could make it out of context."
             ),
-            verbose=True,
+            verbose=BOT_VERBOSE,
             allow_delegation=False,
             llm=self.selected_llm,
             max_iter=5,
-            tools=[ask_expert],  # Correctly pass the tools list
+            tools=crew_tools(),
         )
 
     def writer(self):
+        from crewai import Agent
+
         # Setup the Writer agent
         return Agent(
             role="Content Writer",
@@ -252,12 +515,14 @@ class ResearchCrewAgents:
                 "You are a professional in Business overview writer. You need to write the content in a way that is engaging and informative for Business customer."
                 "Also, you are a skilled writer who excels at turning raw data into captivating narratives."
             ),
-            verbose=True,
+            verbose=BOT_VERBOSE,
             allow_delegation=False,
             llm=self.selected_llm,
         )
 
     def hallucination(self):
+        from crewai import Agent
+
         # Setup the Conclusion agent
         return Agent(
             role="Hallucination Grader",
@@ -266,7 +531,7 @@ class ResearchCrewAgents:
                 "You are a hallucination grader assessing whether an answer is grounded in / supported by a set of facts."
                 "Make sure you meticulously review the answer and check if the response provided is in alignmnet with the question asked"
             ),
-            verbose=True,
+            verbose=BOT_VERBOSE,
             allow_delegation=False,
             llm=self.selected_llm,
         )
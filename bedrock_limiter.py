@@ -0,0 +1,492 @@
+#!/usr/bin/env python
+"""
+Adaptive rate limiter for Bedrock calls, shared by every gunicorn worker.
+
+Each model ID (or knowledge base ID) has a token bucket whose rate adapts
+AIMD-style: every success raises it by BEDROCK_RATE_INCREASE requests/s
+and every ThrottlingException halves it. Every call also takes a token
+from a global bucket. Low-priority calls (image generation) may not take
+the last BEDROCK_LOW_PRIORITY_RESERVE tokens of the global bucket, and
+they wait while a text call is waiting. Text answers therefore go first
+when Bedrock is busy.
+
+The buckets live in one SQLite file (BEDROCK_LIMITER_DB), so workers
+share the limits and the throttling feedback. LimitedClient wraps a
+boto3 client: calls wait for a token and throttled calls are retried with
+jittered exponential backoff. The crew's LLM calls go through LiteLLM's own
+boto3 client instead, so install_llm_callbacks() takes their tokens and
+feeds their throttles back from LiteLLM callbacks.
+
+    python bedrock_limiter.py    # benchmark against a local fake endpoint that throttles
+"""
+import os
+import json
+import time
+import random
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+import deadline
+from tracing import increment, observe
+
+logger = logging.getLogger(__name__)
+
+LIMITER_DB = os.getenv("BEDROCK_LIMITER_DB", "bedrock_limiter.db")
+
+# Per-model defaults in requests/s; BEDROCK_LIMITS overrides them per model,
+# e.g. '{"amazon.titan-image-generator-v2:0": {"rate": 1, "burst": 2}}'
+DEFAULT_LIMIT = {
+    "rate": float(os.getenv("BEDROCK_RATE", "5")),
+    "burst": float(os.getenv("BEDROCK_BURST", "10")),
+    "min_rate": float(os.getenv("BEDROCK_MIN_RATE", "0.2")),
+    "max_rate": float(os.getenv("BEDROCK_MAX_RATE", "50")),
+}
+LIMITS = json.loads(os.getenv("BEDROCK_LIMITS", "{}"))
+GLOBAL_KEY = "*"
+GLOBAL_LIMIT = {
+    "rate": float(os.getenv("BEDROCK_GLOBAL_RATE", "20")),
+    "burst": float(os.getenv("BEDROCK_GLOBAL_BURST", "40")),
+}
+RATE_INCREASE = float(os.getenv("BEDROCK_RATE_INCREASE", "0.1"))
+RATE_DECREASE = 0.5
+LOW_PRIORITY_RESERVE = float(os.getenv("BEDROCK_LOW_PRIORITY_RESERVE", "5"))
+LOW_PRIORITY_MODELS = set(
+    os.getenv("BEDROCK_LOW_PRIORITY_MODELS", "amazon.titan-image-generator-v2:0").split(",")
+)
+ACQUIRE_TIMEOUT = float(os.getenv("BEDROCK_ACQUIRE_TIMEOUT", "30"))
+
+MAX_ATTEMPTS = int(os.getenv("BEDROCK_MAX_ATTEMPTS", "5"))
+BACKOFF_BASE = 0.25
+BACKOFF_MAX = 8.0
+THROTTLING_CODES = {"ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException"}
+TRANSIENT_CODES = {"ServiceUnavailableException", "InternalServerException", "ModelNotReadyException"}
+
+HIGH = "high"
+LOW = "low"
+
+# API parameter that identifies the limited resource of each operation
+LIMITED_OPERATIONS = {
+    "invoke_model": "modelId",
+    "invoke_model_with_response_stream": "modelId",
+    "converse": "modelId",
+    "converse_stream": "modelId",
+    "retrieve": "knowledgeBaseId",
+    "retrieve_and_generate": "retrieveAndGenerateConfiguration",
+}
+
+
+class LimiterTimeout(TimeoutError):
+    """Raised when no Bedrock capacity frees up within the acquire timeout."""
+
+
+_priority = threading.local()
+
+
+@contextmanager
+def priority(level):
+    """Runs the Bedrock calls made in this block at the given priority."""
+    previous = getattr(_priority, "level", None)
+    _priority.level = level
+    try:
+        yield
+    finally:
+        _priority.level = previous
+
+
+def priority_for(key):
+    level = getattr(_priority, "level", None)
+    if level is not None:
+        return level
+    return LOW if key in LOW_PRIORITY_MODELS else HIGH
+
+
+def backoff(attempt):
+    """Full-jitter exponential backoff in seconds."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+
+class BedrockLimiter:
+    """
+    Args:
+        path (str): SQLite file shared by the processes that share a quota.
+        limits (dict): Per-key overrides of DEFAULT_LIMIT.
+    """
+
+    def __init__(self, path=LIMITER_DB, limits=None, global_limit=None):
+        self.path = path
+        self.limits = LIMITS if limits is None else limits
+        self.global_limit = global_limit or GLOBAL_LIMIT
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, "
+                "rate REAL, updated REAL, priority_until REAL DEFAULT 0)"
+            )
+
+    def _connect(self):
+        # sqlite3 connections must not cross threads or fork()
+        pid = os.getpid()
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != pid:
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = pid
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def limit(self, key):
+        if key == GLOBAL_KEY:
+            return dict(DEFAULT_LIMIT, **self.global_limit)
+        return dict(DEFAULT_LIMIT, **self.limits.get(key, {}))
+
+    def _load(self, db, key, now):
+        """The refilled (tokens, rate, priority_until) of a bucket."""
+        limit = self.limit(key)
+        row = db.execute(
+            "SELECT tokens, rate, updated, priority_until FROM buckets WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return limit["burst"], limit["rate"], 0.0
+        tokens, rate, updated, priority_until = row
+        return min(limit["burst"], tokens + max(0.0, now - updated) * rate), rate, priority_until
+
+    @staticmethod
+    def _store(db, key, tokens, rate, now, priority_until=0.0):
+        db.execute(
+            "INSERT OR REPLACE INTO buckets (key, tokens, rate, updated, priority_until) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, tokens, rate, now, priority_until),
+        )
+
+    def try_acquire(self, key, level=HIGH):
+        """Takes a token for `key` if one is free; returns 0 or the seconds to wait."""
+        now = time.time()
+        with self._transaction() as db:
+            tokens, rate, _ = self._load(db, key, now)
+            shared, shared_rate, priority_until = self._load(db, GLOBAL_KEY, now)
+            needed = 1.0 + (LOW_PRIORITY_RESERVE if level == LOW else 0.0)
+            if tokens >= 1.0 and shared >= needed and (level == HIGH or now >= priority_until):
+                self._store(db, key, tokens - 1.0, rate, now)
+                self._store(db, GLOBAL_KEY, shared - 1.0, shared_rate, now, priority_until)
+                return 0.0
+
+            wait = max((1.0 - tokens) / rate, (needed - shared) / shared_rate, 0.01)
+            if level == HIGH:
+                # Keep image calls back until this text call wakes up again
+                # (acquire() sleeps up to 1.5x the wait)
+                priority_until = max(priority_until, now + min(wait, 1.0) * 1.5 + 0.05)
+            else:
+                wait = max(wait, priority_until - now)
+            self._store(db, key, tokens, rate, now)
+            self._store(db, GLOBAL_KEY, shared, shared_rate, now, priority_until)
+            return wait
+
+    def acquire(self, key, level=None, timeout=ACQUIRE_TIMEOUT):
+        """Blocks until a token for `key` is free."""
+        level = level or priority_for(key)
+        start = time.monotonic()
+        while True:
+            wait = self.try_acquire(key, level)
+            waited = time.monotonic() - start
+            if wait == 0.0:
+                if waited > 0.0:
+                    observe("bot_stage_seconds", waited, stage=f"bedrock_wait:{level}")
+                return
+            if waited + wait > timeout:
+                raise LimiterTimeout(f"No Bedrock capacity for {key} within {timeout}s")
+            # Jitter keeps the workers from waking up in lockstep
+            time.sleep(min(wait, 1.0) * random.uniform(1.0, 1.5))
+
+    def _adjust(self, key, factor=1.0, step=0.0):
+        limit = self.limit(key)
+        now = time.time()
+        with self._transaction() as db:
+            tokens, rate, _ = self._load(db, key, now)
+            rate = min(limit["max_rate"], max(limit["min_rate"], rate * factor + step))
+            if factor < 1.0:
+                # Stop the burst that was just throttled
+                tokens = min(tokens, 0.0)
+            self._store(db, key, tokens, rate, now)
+        return rate
+
+    def record_success(self, key):
+        return self._adjust(key, step=RATE_INCREASE)
+
+    def record_throttle(self, key):
+        rate = self._adjust(key, factor=RATE_DECREASE)
+        increment("bot_bedrock_throttles_total", model=key)
+        logger.warning("Bedrock throttled %s; rate now %.2f/s", key, rate)
+        return rate
+
+    def call(self, key, fn, *args, **kwargs):
+        """Calls fn under the limit for `key`, retrying throttled and transient failures."""
+        from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError
+
+        for attempt in range(MAX_ATTEMPTS):
+            self.acquire(key, timeout=min(ACQUIRE_TIMEOUT, deadline.timeout("crew")))
+            try:
+                result = fn(*args, **kwargs)
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code")
+                if code in THROTTLING_CODES:
+                    self.record_throttle(key)
+                elif code not in TRANSIENT_CODES:
+                    raise
+                if attempt == MAX_ATTEMPTS - 1:
+                    raise
+            except BotoConnectionError:
+                if attempt == MAX_ATTEMPTS - 1:
+                    raise
+            else:
+                self.record_success(key)
+                return result
+            time.sleep(backoff(attempt))
+
+    def stats(self):
+        rows = self._connect().execute("SELECT key, tokens, rate FROM buckets ORDER BY key").fetchall()
+        return {key: {"tokens": round(tokens, 2), "rate": round(rate, 2)} for key, tokens, rate in rows}
+
+
+class LimitedClient:
+    """A boto3 client whose Bedrock model and retrieve calls go through a BedrockLimiter."""
+
+    def __init__(self, client, limiter):
+        self._client = client
+        self._limiter = limiter
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        parameter = LIMITED_OPERATIONS.get(name)
+        if parameter is None:
+            return attr
+
+        def limited(*args, **kwargs):
+            key = kwargs.get(parameter)
+            return self._limiter.call(key if isinstance(key, str) else name, attr, *args, **kwargs)
+
+        limited.__name__ = name
+        return limited
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """The process-wide BedrockLimiter, or None when BEDROCK_LIMITER_DB is empty."""
+    global _limiter
+    if _limiter is None and LIMITER_DB:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = BedrockLimiter()
+    return _limiter
+
+
+# LiteLLM model name prefixes in front of the Bedrock model ID
+_LITELLM_PREFIXES = ("bedrock/", "converse/", "invoke/")
+
+
+def litellm_key(kwargs):
+    """The limiter key (model ID) of a LiteLLM call, or None if it is not a Bedrock call."""
+    model = kwargs.get("model") or ""
+    provider = kwargs.get("custom_llm_provider") or (kwargs.get("litellm_params") or {}).get(
+        "custom_llm_provider"
+    )
+    if provider != "bedrock" and not model.startswith("bedrock/"):
+        return None
+    for prefix in _LITELLM_PREFIXES:
+        if model.startswith(prefix):
+            model = model[len(prefix) :]
+    return model
+
+
+def _litellm_pre_call(kwargs):
+    limiter = get_limiter()
+    key = litellm_key(kwargs)
+    if limiter is not None and key is not None:
+        # LiteLLM logs and ignores callback errors, so on LimiterTimeout the
+        # call still goes ahead, as it would without the limiter
+        limiter.acquire(key, timeout=min(ACQUIRE_TIMEOUT, deadline.timeout("crew")))
+
+
+def _litellm_success(kwargs, response, start_time, end_time):
+    limiter = get_limiter()
+    key = litellm_key(kwargs)
+    if limiter is not None and key is not None:
+        limiter.record_success(key)
+
+
+def _litellm_failure(kwargs, response, start_time, end_time):
+    limiter = get_limiter()
+    key = litellm_key(kwargs)
+    if limiter is None or key is None:
+        return
+    error = kwargs.get("exception")
+    # LiteLLM maps Bedrock's ThrottlingException to its RateLimitError (HTTP 429)
+    if getattr(error, "status_code", None) == 429 or type(error).__name__ in THROTTLING_CODES | {"RateLimitError"}:
+        limiter.record_throttle(key)
+
+
+def install_llm_callbacks():
+    """Puts the crew's LiteLLM Bedrock calls under the shared limiter."""
+    try:
+        import litellm
+    except ImportError:
+        return
+    # input_callback runs in the calling thread before the request is sent
+    for callbacks, callback in (
+        (litellm.input_callback, _litellm_pre_call),
+        (litellm.success_callback, _litellm_success),
+        (litellm.failure_callback, _litellm_failure),
+    ):
+        if callback not in callbacks:
+            callbacks.append(callback)
+
+
+def serve_fake_bedrock(rate, burst):
+    """
+    Local bedrock-runtime endpoint that answers converse calls and throttles
+    (HTTP 429, ThrottlingException) above `rate` requests/s. Returns the server.
+    """
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    lock = threading.Lock()
+    bucket = {"tokens": burst, "updated": time.monotonic(), "ok": 0, "throttled": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with lock:
+                now = time.monotonic()
+                bucket["tokens"] = min(burst, bucket["tokens"] + (now - bucket["updated"]) * rate)
+                bucket["updated"] = now
+                allowed = bucket["tokens"] >= 1.0
+                if allowed:
+                    bucket["tokens"] -= 1.0
+                    bucket["ok"] += 1
+                else:
+                    bucket["throttled"] += 1
+            if allowed:
+                time.sleep(0.02)
+                status, headers, body = 200, {}, {
+                    "output": {"message": {"role": "assistant", "content": [{"text": "ok"}]}},
+                    "stopReason": "end_turn",
+                    "usage": {"inputTokens": 10, "outputTokens": 2, "totalTokens": 12},
+                    "metrics": {"latencyMs": 20},
+                }
+            else:
+                status, headers, body = 429, {"x-amzn-ErrorType": "ThrottlingException"}, {
+                    "message": "Too many requests, please wait before trying again."
+                }
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.bucket = bucket
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _worker(endpoint, limited, calls, threads, db_path, global_limit, results):
+    import boto3
+    from botocore.config import Config
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "offline")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "offline")
+    retries = {"max_attempts": 1 if limited else MAX_ATTEMPTS, "mode": "standard"}
+    client = boto3.client(
+        "bedrock-runtime",
+        region_name="us-east-1",
+        endpoint_url=endpoint,
+        config=Config(retries=retries, max_pool_connections=threads),
+    )
+    if limited:
+        client = LimitedClient(client, BedrockLimiter(db_path, global_limit=global_limit))
+
+    latencies, failures = [], 0
+    lock = threading.Lock()
+
+    def run():
+        nonlocal failures
+        for _ in range(calls):
+            start = time.perf_counter()
+            try:
+                client.converse(modelId="meta.llama3-70b-instruct-v1:0", messages=[])
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+            except Exception:
+                with lock:
+                    failures += 1
+
+    pool = [threading.Thread(target=run) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    results.put((latencies, failures))
+
+
+def benchmark(processes=4, threads=8, calls=10, rate=20.0, burst=10.0):
+    """Runs gunicorn-like worker processes against the fake endpoint with and without the limiter."""
+    import tempfile
+    import multiprocessing
+
+    context = multiprocessing.get_context("fork")
+    for limited in (False, True):
+        server = serve_fake_bedrock(rate, burst)
+        endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+        db_path = os.path.join(tempfile.mkdtemp(), "limiter.db")
+        # Limits are configuration, not state, so every worker needs them
+        global_limit = {"rate": rate * 2, "burst": burst}
+        results = context.Queue()
+        start = time.perf_counter()
+        workers = [
+            context.Process(
+                target=_worker, args=(endpoint, limited, calls, threads, db_path, global_limit, results)
+            )
+            for _ in range(processes)
+        ]
+        for p in workers:
+            p.start()
+        outcomes = [results.get() for _ in workers]
+        for p in workers:
+            p.join()
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+
+        latencies = sorted(l for ls, _ in outcomes for l in ls)
+        failures = sum(f for _, f in outcomes)
+        pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+        print(
+            f"{'limiter' if limited else 'botocore retries':<17} ok={len(latencies):>4} failed={failures:>4} "
+            f"throttled={server.bucket['throttled']:>5} p50={pct(0.5):>7.0f}ms p99={pct(0.99):>7.0f}ms "
+            f"{len(latencies) / elapsed:>6.1f} req/s"
+        )
+
+
+if __name__ == "__main__":
+    benchmark()
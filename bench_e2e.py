@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+"""
+Offline end-to-end latency benchmark for the LINE webhook pipeline.
+
+Replays LINE webhook payloads against the Flask app with every external
+dependency replaced by a local stand-in with configurable latency:
+
+    bedrock-runtime        FakeBedrockRuntime (fine-tuned model, Titan text/image, converse)
+    bedrock-agent-runtime  FakeAgentRuntime (knowledge-base retrieve)
+    s3                     FakeS3
+    LINE reply/push API    local HTTP stub server (LINE_API_BASE)
+    crew (Llama3-70B)      FakeResearchCrew: agent turns + retrieve + local grading
+
+Reports throughput and p50/p95/p99 per stage at each concurrency level.
+
+    python bench_e2e.py --requests 200 --concurrency 1 4 16 --llm-latency 0.05
+"""
+import os
+import io
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+import threading
+from collections import defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Offline configuration, set before main is imported
+os.environ.setdefault("SEMANTIC_CACHE_EMBEDDER", "hashing")
+os.environ.setdefault("TRANSLATION_BACKEND", "dictionary")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "offline")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "offline")
+
+# 1x1 transparent PNG
+PNG = base64.b64encode(
+    bytes.fromhex(
+        "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+        "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+    )
+).decode()
+
+
+class Latency:
+    """Sleeps for a mean latency with +/- jitter (fraction of the mean)."""
+
+    def __init__(self, mean, jitter=0.2):
+        self.mean = mean
+        self.jitter = jitter
+
+    def __call__(self):
+        if self.mean > 0:
+            time.sleep(max(0.0, random.uniform(1 - self.jitter, 1 + self.jitter) * self.mean))
+
+
+class StreamingBody(io.BytesIO):
+    pass
+
+
+class FakeBedrockRuntime:
+    def __init__(self, text_latency, image_latency, llm_latency):
+        self.text_latency = Latency(text_latency)
+        self.image_latency = Latency(image_latency)
+        self.llm_latency = Latency(llm_latency)
+
+    def invoke_model(self, body, modelId, **kwargs):
+        if "image-generator" in modelId:
+            self.image_latency()
+            payload = {"images": [PNG]}
+        else:
+            self.text_latency()
+            payload = {"results": [{"outputText": "A clean diagram of the solution.", "tokenCount": 8}]}
+        return {"body": StreamingBody(json.dumps(payload).encode())}
+
+    def converse(self, modelId, messages, **kwargs):
+        self.llm_latency()
+        return {
+            "output": {"message": {"role": "assistant", "content": [{"text": "Offline answer."}]}},
+            "usage": {"inputTokens": 100, "outputTokens": 20, "totalTokens": 120},
+        }
+
+
+class FakeAgentRuntime:
+    def __init__(self, latency):
+        self.latency = Latency(latency)
+
+    def retrieve(self, retrievalQuery, knowledgeBaseId, retrievalConfiguration):
+        self.latency()
+        n = retrievalConfiguration["vectorSearchConfiguration"]["numberOfResults"]
+        return {
+            "retrievalResults": [
+                {
+                    "content": {"text": f"Passage {i} about {retrievalQuery['text']}."},
+                    "location": {"s3Location": {"uri": f"s3://kb/doc{i}.pdf"}},
+                    "score": 0.5 - i * 0.05,
+                }
+                for i in range(n)
+            ]
+        }
+
+
+class FakeS3:
+    def __init__(self, latency):
+        self.latency = Latency(latency)
+        self.objects = set()
+
+    def head_object(self, Bucket, Key):
+        self.latency()
+        if Key not in self.objects:
+            from botocore.exceptions import ClientError
+
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {}
+
+    def put_object(self, Bucket, Key, **kwargs):
+        self.latency()
+        self.objects.add(Key)
+        return {}
+
+
+class LineStub:
+    """Local LINE Messaging API stub recording when each reply/push arrived."""
+
+    def __init__(self, latency):
+        self.latency = Latency(latency)
+        self.replies = {}
+        self.pushes = defaultdict(list)
+        self.condition = threading.Condition()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.latency()
+                with stub.condition:
+                    if self.path.endswith("/reply"):
+                        stub.replies[payload["replyToken"]] = time.perf_counter()
+                    else:
+                        stub.pushes[payload["to"]].append(time.perf_counter())
+                    stub.condition.notify_all()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def wait_reply(self, token, timeout):
+        with self.condition:
+            self.condition.wait_for(lambda: token in self.replies, timeout)
+            return self.replies.get(token)
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def wrap(self, name, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.samples[name].append(time.perf_counter() - start)
+
+        return timed
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.samples[name].append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(q / 100 * (len(values) - 1)))))
+    return values[index]
+
+
+def install_fakes(args, timer):
+    """Imports main with every external dependency replaced; returns (main, line stub)."""
+    line = LineStub(args.line_latency)
+    os.environ["LINE_API_BASE"] = line.base_url
+
+    import clients
+
+    clients.register_client(
+        "bedrock-runtime",
+        FakeBedrockRuntime(args.text_latency, args.image_latency, args.llm_latency),
+    )
+    clients.register_client("bedrock-agent-runtime", FakeAgentRuntime(args.retrieve_latency))
+    clients.register_client("s3", FakeS3(args.s3_latency))
+
+    import main
+    import agents
+
+    llm_latency = Latency(args.llm_latency)
+
+    class FakeResearchCrew(main.ResearchCrew):
+        """Researcher (with the retrieval tool) and writer turns, then grading."""
+
+        def run(self):
+            llm_latency()  # researcher decides to call the tool
+            chunks = agents.retrieve(self.inputs["question"])
+            llm_latency()  # researcher answer
+            llm_latency()  # writer
+            answer = " ".join(chunk["text"] for chunk in chunks[:2])
+            grade = main.grounding.grade(answer, [chunk["text"] for chunk in chunks])
+            if grade.verdict not in (main.PASS, main.FAIL) or main.GROUNDING == "llm":
+                llm_latency()  # hallucination grader
+            return {"result": self.serialize_crew_output(answer), "grounded": grade.verdict == main.PASS}
+
+    main.ResearchCrew = FakeResearchCrew
+    main.ask_question = timer.wrap("ask_question", main.ask_question)
+    main.generate_image = timer.wrap("generate_image", main.generate_image)
+    main.translator.translate = timer.wrap("translate", main.translator.translate)
+    main.router.retrieve = timer.wrap("retrieve", main.router.retrieve)
+    agents.retrieve = timer.wrap("retrieve", agents.retrieve)
+    main.line_client.reply = timer.wrap("line_reply", main.line_client.reply)
+    main.line_client.push = timer.wrap("line_push", main.line_client.push)
+    return main, line
+
+
+def webhook_payload(user, token, question):
+    return {
+        "destination": "Ubot",
+        "events": [
+            {
+                "type": "message",
+                "replyToken": token,
+                "source": {"type": "user", "userId": user},
+                "message": {"type": "text", "id": token, "text": question},
+            }
+        ],
+    }
+
+
+def run_level(main, line, timer, concurrency, total, timeout):
+    client = main.app.test_client()
+    timer.reset()
+    counter = iter(range(total))
+    lock = threading.Lock()
+    failures = []
+
+    def user(user_id):
+        while True:
+            with lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            token = f"c{concurrency}-r{n}"
+            start = time.perf_counter()
+            response = client.post(
+                "/webhook",
+                json=webhook_payload(f"U{user_id}", token, f"question {n} about J Ventures {random.random()}"),
+            )
+            timer.record("webhook_ack", time.perf_counter() - start)
+            replied = line.wait_reply(token, timeout)
+            if response.status_code != 200 or replied is None:
+                failures.append(token)
+            else:
+                timer.record("end_to_end", replied - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"\nconcurrency={concurrency}  requests={total}  failures={len(failures)}  "
+          f"throughput={(total - len(failures)) / elapsed:.1f} req/s")
+    print(f"  {'stage':<16}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, values in sorted(timer.samples.items()):
+        print(
+            f"  {name:<16}{len(values):>7}"
+            + "".join(f"{percentile(values, q) * 1000:>10.1f}" for q in (50, 95, 99))
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per crew LLM turn")
+    parser.add_argument("--retrieve-latency", type=float, default=0.02)
+    parser.add_argument("--text-latency", type=float, default=0.02, help="Titan text / fine-tuned model")
+    parser.add_argument("--image-latency", type=float, default=0.1)
+    parser.add_argument("--s3-latency", type=float, default=0.01)
+    parser.add_argument("--line-latency", type=float, default=0.01)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args(argv)
+
+    timer = StageTimer()
+    app_main, line = install_fakes(args, timer)
+    for concurrency in args.concurrency:
+        run_level(app_main, line, timer, concurrency, args.requests, args.timeout)
+    line.server.shutdown()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""
+Cold-start profile of a gunicorn worker.
+
+Reports the slowest imports of `import main` (from python -X importtime)
+and times a fresh interpreter through import, preload() and a forked
+worker's warmup(), with and without the preload in the parent. The
+preloaded case is what gunicorn.conf.py does.
+
+    python bench_startup.py --top 15
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Offline configuration: no model or network calls during startup
+OFFLINE_ENV = {
+    "SEMANTIC_CACHE_EMBEDDER": "hashing",
+    "TRANSLATION_BACKEND": "dictionary",
+    "AWS_ACCESS_KEY_ID": "offline",
+    "AWS_SECRET_ACCESS_KEY": "offline",
+    "BOT_VERBOSE": "false",
+}
+
+COLD_START = """
+import json, os, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+if PRELOAD:
+    main.preload()
+preloaded = time.perf_counter()
+
+read, write = os.pipe()
+pid = os.fork()
+if pid == 0:
+    import clients
+    clients.reset_clients()
+    begin = time.perf_counter()
+    main.warmup()
+    os.write(write, str(time.perf_counter() - begin).encode())
+    os._exit(0)
+os.waitpid(pid, 0)
+worker = float(os.read(read, 64))
+print(json.dumps({"import": imported - start, "preload": preloaded - imported, "worker_warmup": worker}))
+"""
+
+
+def run(code, env, extra_args=()):
+    return subprocess.run(
+        [sys.executable, *extra_args, "-c", code],
+        cwd=HERE,
+        env=dict(os.environ, **OFFLINE_ENV, **env),
+        capture_output=True,
+        text=True,
+    )
+
+
+def import_profile(module="main", top=15):
+    """The `top` slowest imports of a module by cumulative and by self time."""
+    result = run(f"import {module}", {}, ["-X", "importtime"])
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            own, cumulative, name = line[len("import time:") :].split("|")
+            rows.append((int(own), int(cumulative), name.rstrip()))
+        except ValueError:
+            continue  # the header line
+    if result.returncode != 0:
+        print(result.stderr.strip().splitlines()[-1])
+
+    top_level = [r for r in rows if not r[2].startswith("  ")]
+    total = sum(r[1] for r in top_level)
+    print(f"import {module}: {total / 1e6:.2f} s cumulative, {len(rows)} modules")
+    print(f"  {'cumulative ms':>13}  module")
+    for own, cumulative, name in sorted(top_level, key=lambda r: -r[1])[:top]:
+        print(f"  {cumulative / 1e3:>13.1f}  {name.strip()}")
+    print(f"  {'self ms':>13}  module")
+    for own, cumulative, name in sorted(rows, key=lambda r: -r[0])[:top]:
+        print(f"  {own / 1e3:>13.1f}  {name.strip()}")
+
+
+def cold_start():
+    """Import, preload and forked-worker warm-up times, with and without preload."""
+    for preload in (False, True):
+        result = run(COLD_START.replace("PRELOAD", str(preload)), {})
+        if result.returncode != 0:
+            print(result.stderr.strip().splitlines()[-1])
+            return
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        print(
+            f"{'preloaded master' if preload else 'no preload':<17} import={timings['import']:.2f}s "
+            f"preload={timings['preload']:.2f}s worker warm-up={timings['worker_warmup']:.2f}s"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    import_profile(args.module, args.top)
+    if args.module == "main":
+        print()
+        cold_start()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+"""
+Process-wide registry of long-lived boto3 clients.
+
+Creating a boto3 client resolves credentials, loads the service model and
+opens a fresh connection pool, which costs tens of milliseconds per call.
+Clients are thread-safe, so one client per service is shared by every
+thread in the process.
+
+The registry is fork-safe: clients created in the gunicorn master (with
+--preload) are never handed to a forked worker, because their connection
+pools would share sockets across processes. Each process lazily builds its
+own clients the first time they are requested. The boto3 session holds no
+sockets, so preload() builds it in the master and the workers inherit its
+loaded service models.
+
+Bedrock clients are wrapped in bedrock_limiter.LimitedClient, which
+shares an adaptive rate limit across workers and retries throttled calls
+itself, so botocore makes a single attempt for them.
+"""
+import os
+import threading
+
+REGION_NAME = os.getenv("AWS_REGION", "us-east-1")
+MAX_POOL_CONNECTIONS = int(os.getenv("BOTO_MAX_POOL_CONNECTIONS", "32"))
+LIMITED_SERVICES = ("bedrock-runtime", "bedrock-agent-runtime")
+
+_lock = threading.Lock()
+_pid = None
+_session = None
+_clients = {}
+
+
+def client_config(**overrides):
+    """Returns the botocore Config shared by all registry clients."""
+    from botocore.config import Config
+
+    options = dict(
+        region_name=REGION_NAME,
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        retries={"max_attempts": 3, "mode": "standard"},
+    )
+    options.update(overrides)
+    return Config(**options)
+
+
+def _reset_if_forked():
+    global _pid
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _clients.clear()
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        import boto3
+
+        # boto3.Session is not thread-safe, so all clients come from
+        # one session created and used under the lock.
+        _session = boto3.session.Session(region_name=REGION_NAME)
+    return _session
+
+
+def get_client(service_name: str):
+    """
+    Returns the shared client for a service, creating it on first use.
+
+    Args:
+        service_name (str): e.g. "bedrock-runtime", "bedrock-agent-runtime", "s3".
+    Returns:
+        The boto3 client for this process.
+    """
+    client = _clients.get(service_name) if _pid == os.getpid() else None
+    if client is not None:
+        return client
+
+    with _lock:
+        _reset_if_forked()
+        client = _clients.get(service_name)
+        if client is None:
+            session = _get_session()
+            limiter = None
+            if service_name in LIMITED_SERVICES:
+                from bedrock_limiter import LimitedClient, get_limiter
+
+                limiter = get_limiter()
+            if limiter is None:
+                client = session.client(service_name, config=client_config())
+            else:
+                config = client_config(retries={"max_attempts": 1, "mode": "standard"})
+                client = LimitedClient(session.client(service_name, config=config), limiter)
+            _clients[service_name] = client
+        return client
+
+
+def register_client(service_name: str, client):
+    """Installs a client (e.g. a local fake) for this process."""
+    with _lock:
+        _reset_if_forked()
+        _clients[service_name] = client
+
+
+def reset_clients():
+    """Drops every cached client; call from gunicorn's post_fork hook."""
+    global _pid
+    with _lock:
+        _pid = os.getpid()
+        _clients.clear()
+
+
+def preload(services=("bedrock-runtime", "bedrock-agent-runtime", "s3")):
+    """
+    Loads the session and service models once, e.g. in the gunicorn master.
+
+    The clients are dropped again; forked workers build their own from the
+    inherited session.
+    """
+    with _lock:
+        session = _get_session()
+        for service in services:
+            session.client(service, config=client_config())
+        _clients.clear()
+
+
+def benchmark(iterations=50):
+    """Compares per-request client creation with the shared registry."""
+    import time
+    import boto3
+
+    services = ("bedrock-runtime", "bedrock-agent-runtime", "s3")
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for service in services:
+            boto3.client(service, region_name=REGION_NAME)
+    per_request = (time.perf_counter() - start) / iterations
+
+    reset_clients()
+    start = time.perf_counter()
+    for service in services:
+        get_client(service)
+    first_use = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for service in services:
+            get_client(service)
+    pooled = (time.perf_counter() - start) / iterations
+
+    print(f"boto3.client() per request: {per_request * 1000:.2f} ms")
+    print(f"shared registry, once per process: {first_use * 1000:.2f} ms")
+    print(f"shared registry per request: {pooled * 1000:.4f} ms")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,114 @@
+"""
+Context assembly for LLM prompts.
+
+Retrieved chunks are deduplicated, ranked by score and trimmed to a token
+budget before they go into a prompt, so every Llama3-70B call only pays
+for the passages it can actually use:
+
+    format_context(select_chunks(retrieve(question), budget("research")))
+
+Token counts are estimated from the text length (about four characters
+per token for the Llama 3 tokenizer on English text), which is close
+enough for budgeting and needs no tokenizer download.
+"""
+import os
+import re
+
+CHARS_PER_TOKEN = 4
+# Near-duplicate threshold on the word 3-shingle Jaccard similarity
+DUPLICATE_SIMILARITY = 0.8
+# A trimmed passage shorter than this is dropped instead
+MIN_PASSAGE_TOKENS = 32
+
+BUDGETS = {
+    "research": int(os.getenv("CONTEXT_BUDGET_RESEARCH", "1200")),
+    "direct": int(os.getenv("CONTEXT_BUDGET_DIRECT", "800")),
+}
+
+_WORD = re.compile(r"\w+")
+
+
+def estimate_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def budget(task):
+    """Context token budget of a task ("research" or "direct")."""
+    return BUDGETS[task]
+
+
+def _shingles(text):
+    words = _WORD.findall(text.lower())
+    if len(words) < 3:
+        return {" ".join(words)}
+    return {" ".join(words[i : i + 3]) for i in range(len(words) - 2)}
+
+
+def dedupe(chunks, similarity=DUPLICATE_SIMILARITY):
+    """Drops chunks that repeat (or nearly repeat) an earlier chunk."""
+    kept = []
+    kept_shingles = []
+    for chunk in chunks:
+        text = chunk.get("text", "").strip()
+        if not text:
+            continue
+        shingles = _shingles(text)
+        duplicate = False
+        for other in kept_shingles:
+            overlap = len(shingles & other)
+            # Contained in (or containing) a kept chunk counts as a repeat too
+            if overlap / len(shingles | other) >= similarity or overlap == min(len(shingles), len(other)):
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(chunk)
+            kept_shingles.append(shingles)
+    return kept
+
+
+def _trim(text, tokens):
+    """Cuts text to about `tokens`, at a sentence or word boundary."""
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    end = max(cut.rfind(". "), cut.rfind("\n"))
+    if end < limit // 2:
+        end = cut.rfind(" ")
+    return cut[: end + 1 if end > 0 else limit].rstrip() + " ..."
+
+
+def select_chunks(chunks, max_tokens):
+    """
+    Highest-scoring distinct chunks that fit in `max_tokens`.
+
+    The last chunk is trimmed to the remaining budget rather than dropped
+    when enough of it fits to be useful.
+    """
+    ranked = dedupe(sorted(chunks, key=lambda c: c.get("score") or 0.0, reverse=True))
+    selected = []
+    remaining = max_tokens
+    for chunk in ranked:
+        text = chunk["text"].strip()
+        cost = estimate_tokens(text)
+        if cost > remaining:
+            if remaining < MIN_PASSAGE_TOKENS:
+                break
+            text = _trim(text, remaining)
+            cost = estimate_tokens(text)
+        selected.append(dict(chunk, text=text))
+        remaining -= cost
+        if remaining < MIN_PASSAGE_TOKENS:
+            break
+    return selected
+
+
+def format_context(chunks):
+    """Numbered passages, one per paragraph, with their source."""
+    lines = []
+    for i, chunk in enumerate(chunks, 1):
+        source = chunk.get("source")
+        suffix = f" (source: {source.rsplit('/', 1)[-1]})" if source else ""
+        lines.append(f"[{i}] {chunk['text']}{suffix}")
+    return "\n\n".join(lines)
+
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""
+Bounded conversation history keyed by LINE source ID (user, group or room).
+
+InMemoryConversationStore keeps history per process. SQLiteConversationStore
+keeps it in one SQLite file so every gunicorn worker sees the same history.
+Both cap the number of messages per conversation and the number of
+conversations, evicting the least recently used conversation first.
+"""
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+
+MAX_MESSAGES = int(os.getenv("CONVERSATION_MAX_MESSAGES", "20"))
+MAX_CONVERSATIONS = int(os.getenv("CONVERSATION_MAX_CONVERSATIONS", "10000"))
+MAX_TEXT_LENGTH = 2000
+
+
+class Message:
+    __slots__ = ("role", "text", "ts")
+
+    def __init__(self, role, text, ts=None):
+        self.role = role
+        self.text = text[:MAX_TEXT_LENGTH]
+        self.ts = time.time() if ts is None else ts
+
+    def to_dict(self):
+        return {"role": self.role, "text": self.text, "ts": self.ts}
+
+    def __repr__(self):
+        return f"Message({self.role!r}, {self.text!r})"
+
+
+class InMemoryConversationStore:
+    def __init__(self, max_messages=MAX_MESSAGES, max_conversations=MAX_CONVERSATIONS):
+        self.max_messages = max_messages
+        self.max_conversations = max_conversations
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+
+    def append(self, key, role, text):
+        with self._lock:
+            history = self._conversations.get(key)
+            if history is None:
+                history = self._conversations[key] = deque(maxlen=self.max_messages)
+            self._conversations.move_to_end(key)
+            history.append(Message(role, text))
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+
+    def history(self, key):
+        with self._lock:
+            history = self._conversations.get(key)
+            return list(history) if history is not None else []
+
+    def __len__(self):
+        return len(self._conversations)
+
+
+class SQLiteConversationStore:
+    """Shares history across worker processes through one SQLite database."""
+
+    def __init__(
+        self,
+        path,
+        max_messages=MAX_MESSAGES,
+        max_conversations=MAX_CONVERSATIONS,
+    ):
+        self.path = path
+        self.max_messages = max_messages
+        self.max_conversations = max_conversations
+        self._local = threading.local()
+        with self._connect() as db:
+            db.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    conversation TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    ts REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS messages_conversation
+                    ON messages (conversation, id);
+                CREATE TABLE IF NOT EXISTS conversations (
+                    conversation TEXT PRIMARY KEY,
+                    last_seen REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS conversations_last_seen
+                    ON conversations (last_seen);
+                """
+            )
+
+    def _connect(self):
+        # sqlite3 connections must not cross threads or fork()
+        pid = os.getpid()
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != pid:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = pid
+        return db
+
+    def append(self, key, role, text):
+        message = Message(role, text)
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO messages (conversation, role, text, ts) VALUES (?, ?, ?, ?)",
+                (key, message.role, message.text, message.ts),
+            )
+            db.execute(
+                "DELETE FROM messages WHERE conversation = ? AND id NOT IN "
+                "(SELECT id FROM messages WHERE conversation = ? ORDER BY id DESC LIMIT ?)",
+                (key, key, self.max_messages),
+            )
+            updated = db.execute(
+                "UPDATE conversations SET last_seen = ? WHERE conversation = ?",
+                (message.ts, key),
+            ).rowcount
+            if updated:
+                return
+            # Only a new conversation can take the store over its cap
+            db.execute(
+                "INSERT INTO conversations (conversation, last_seen) VALUES (?, ?)",
+                (key, message.ts),
+            )
+            (count,) = db.execute("SELECT COUNT(*) FROM conversations").fetchone()
+            if count <= self.max_conversations:
+                return
+            evicted = db.execute(
+                "SELECT conversation FROM conversations ORDER BY last_seen LIMIT ?",
+                (count - self.max_conversations,),
+            ).fetchall()
+            db.executemany("DELETE FROM messages WHERE conversation = ?", evicted)
+            db.executemany("DELETE FROM conversations WHERE conversation = ?", evicted)
+
+    def history(self, key):
+        rows = self._connect().execute(
+            "SELECT role, text, ts FROM messages WHERE conversation = ? ORDER BY id",
+            (key,),
+        ).fetchall()
+        return [Message(role, text, ts) for role, text, ts in rows]
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+
+
+def store_from_env():
+    """Builds the store selected by CONVERSATION_STORE (memory or sqlite)."""
+    if os.getenv("CONVERSATION_STORE", "memory") == "sqlite":
+        return SQLiteConversationStore(os.getenv("CONVERSATION_DB", "conversations.db"))
+    return InMemoryConversationStore()
+
+
+def soak(store, users=50000, messages=200000):
+    """Appends many messages and reports traced memory at intervals."""
+    import random
+    import tracemalloc
+
+    tracemalloc.start()
+    for i in range(messages):
+        store.append(f"U{random.randrange(users)}", "user", "what is a double whopper " * 4)
+        if i % (messages // 10) == 0:
+            current, _ = tracemalloc.get_traced_memory()
+            print(f"{i:>8} messages  {len(store):>6} conversations  {current / 1e6:.1f} MB")
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    soak(InMemoryConversationStore(max_conversations=5000))
@@ -1,59 +1,236 @@
 #!/usr/bin/env python
 import pandas as pd
+import numpy as np
 import json
 import os
+import re
+import zlib
+import math
+import time
+import hashlib
 
 CHAR_LIMIT = 10000
 CSV_FILE_PATH = "Data/jventures_crawl_results.csv"
+OUTPUT_FILE_PATH = "Data/jventures_train.jsonl"
+CHUNK_SIZE = 10000
 
+# MinHash/LSH settings: 64 permutations split into 8 bands of 8 rows flags
+# pages whose 5-word shingle sets are roughly 75% or more similar
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+BANDS = 8
+_MERSENNE = np.uint64((1 << 31) - 1)
+_rng = np.random.RandomState(42)
+_PERM_A = _rng.randint(1, (1 << 31) - 1, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, (1 << 31) - 1, size=NUM_PERM).astype(np.uint64)
 
-def csv2json():
-    # Read the CSV file
-    df = pd.read_csv(CSV_FILE_PATH)
+# Pages the duplicate filters are sized for, and their false positive rate per
+# lookup (a false positive drops a unique page). Past the capacity the filters
+# keep working but drop more unique pages.
+DEDUP_CAPACITY = 1_000_000
+DEDUP_ERROR_RATE = 1e-4
 
-    # Ensure 'Title' and 'Content' columns exist
-    required_columns = ["Title", "Content"]
-    if not all(col in df.columns for col in required_columns):
-        raise ValueError("CSV file must contain 'Title' and 'Content' columns")
 
-    # Use 'Title' as the 'prompt' field
-    df["prompt"] = df["Title"]
+def read_chunks(path, chunksize=CHUNK_SIZE):
+    """Yields DataFrame chunks from a CSV or the crawler's JSONL output."""
+    if path.endswith((".jsonl", ".json")):
+        return pd.read_json(path, lines=True, chunksize=chunksize, dtype=False)
+    return pd.read_csv(path, chunksize=chunksize)
 
-    # Use 'Content' as the 'completion' field
-    df["completion"] = df["Content"]
 
-    # Filter data based on character limits
-    df = df[
-        (df["prompt"].str.len() < CHAR_LIMIT)
-        & (df["completion"].str.len() < CHAR_LIMIT)
-        & (df["prompt"].str.len() + df["completion"].str.len() < CHAR_LIMIT)
-    ]
+def minhash(text):
+    """MinHash signature of a text's word shingles, or None if it has no words."""
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    shingles = {
+        zlib.crc32(" ".join(words[i : i + SHINGLE_SIZE]).encode("utf-8"))
+        for i in range(max(1, len(words) - SHINGLE_SIZE + 1))
+    }
+    x = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+    return ((np.outer(_PERM_A, x) + _PERM_B[:, None]) % _MERSENNE).min(axis=1)
 
-    # Convert to JSON format required by AWS Bedrock
-    def to_bedrock_format(row):
-        return {"prompt": row["prompt"], "completion": row["completion"]}
 
-    # Save all data to a single JSONL file
-    json_data = df.apply(to_bedrock_format, axis=1).tolist()
-    with open(
-        "Data/jventures_train.jsonl", "w", encoding="ascii", errors="replace"
-    ) as f:
-        for item in json_data:
-            # ensure_ascii=False removed since we're using ascii encoding
-            f.write(json.dumps(item) + "\n")
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
 
+
+class BloomFilter:
+    """
+    Set membership of 64-bit hashes in a fixed-size bit array.
+
+    Args:
+        capacity (int): Number of keys the filter is sized for.
+        error_rate (float): False positive rate at that capacity.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.hashes = max(1, round(-math.log2(error_rate)))
+        self.size = math.ceil(capacity * self.hashes / math.log(2))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+    def add(self, key):
+        """Adds a key; returns True if it was (probably) added before."""
+        # Double hashing: the key's low and high 32 bits give the positions.
+        # Plain ints beat NumPy here, the arrays would only have a dozen items.
+        bits = self.bits
+        low = key & 0xFFFFFFFF
+        high = (key >> 32) | 1
+        present = True
+        for i in range(self.hashes):
+            position = (low + i * high) % self.size
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not bits[byte] & mask:
+                present = False
+                bits[byte] |= mask
+        return present
+
+
+class Deduplicator:
+    """
+    Drops exact duplicates (by content hash) and near duplicates (by MinHash
+    LSH banding), such as pages that are mostly shared nav/footer text.
+
+    The hashes are kept in Bloom filters, so the state has a fixed size
+    (see nbytes) however many pages go through.
+    """
+
+    def __init__(self, bands=BANDS, capacity=DEDUP_CAPACITY, error_rate=DEDUP_ERROR_RATE):
+        self.bands = bands
+        self.exact = BloomFilter(capacity, error_rate)
+        # One key per band and page
+        self.buckets = BloomFilter(capacity * bands, error_rate)
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    @property
+    def nbytes(self):
+        return self.exact.nbytes + self.buckets.nbytes
+
+    def is_duplicate(self, text):
+        if self.exact.add(_hash64(text.encode("utf-8"))):
+            self.exact_duplicates += 1
+            return True
+
+        signature = minhash(text)
+        if signature is None:
+            return False
+        keys = [
+            _hash64(band.to_bytes(1, "little") + rows.tobytes())
+            for band, rows in enumerate(np.split(signature, self.bands))
+        ]
+        duplicate = any([self.buckets.add(key) for key in keys])
+        if duplicate:
+            self.near_duplicates += 1
+        return duplicate
+
+
+def csv2json(input_path=CSV_FILE_PATH, output_path=OUTPUT_FILE_PATH, chunksize=CHUNK_SIZE, dedup=None):
+    """
+    Streams the crawl results into Bedrock fine-tuning JSONL (prompt/completion).
+
+    Reads CSV or JSONL in chunks, filters on CHAR_LIMIT with vectorized
+    string lengths, drops exact and near-duplicate pages and writes UTF-8
+    output incrementally. Memory is one chunk plus the fixed-size
+    Deduplicator filters, independent of page size and count.
+    """
+    dedup = dedup or Deduplicator()
+    total = written = missing = 0
+    start = time.perf_counter()
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        for df in read_chunks(input_path, chunksize):
+            # Ensure 'Title' and 'Content' columns exist
+            required_columns = ["Title", "Content"]
+            if not all(col in df.columns for col in required_columns):
+                raise ValueError("Input must contain 'Title' and 'Content' columns")
+            total += len(df)
+
+            # Check for NaN or empty values in 'prompt' or 'completion'
+            present = df["Title"].notna() & df["Content"].notna()
+            missing += int((~present).sum())
+            df = df[present]
+
+            # Use 'Title' as the 'prompt' field and 'Content' as the 'completion' field
+            prompts = df["Title"].astype(str)
+            completions = df["Content"].astype(str)
+
+            # Filter data based on character limits
+            prompt_len = prompts.str.len()
+            completion_len = completions.str.len()
+            keep = (
+                (prompt_len < CHAR_LIMIT)
+                & (completion_len < CHAR_LIMIT)
+                & (prompt_len + completion_len < CHAR_LIMIT)
+            )
+
+            lines = []
+            for prompt, completion in zip(prompts[keep], completions[keep]):
+                if dedup.is_duplicate(completion):
+                    continue
+                lines.append(
+                    json.dumps(
+                        {"prompt": prompt, "completion": completion}, ensure_ascii=False
+                    )
+                )
+            f.write("\n".join(lines) + ("\n" if lines else ""))
+            written += len(lines)
+
+    elapsed = time.perf_counter() - start
     print(f"Conversion complete. Output file:")
-    print("- jventures_train.jsonl")
-    print(f"Total entries: {len(json_data)}")
+    print(f"- {os.path.basename(output_path)}")
+    print(f"Total entries: {written}")
+    print(
+        f"Read {total} rows, skipped {missing} with missing values, "
+        f"{dedup.exact_duplicates} exact and {dedup.near_duplicates} near duplicates "
+        f"({total / elapsed:.0f} rows/s)"
+    )
+    return written
+
+
+def benchmark(rows=1_000_000, chunksize=CHUNK_SIZE):
+    """Converts a synthetic CSV of `rows` pages and reports throughput and peak RSS."""
+    import random
+    import resource
+    import tempfile
 
-    # Check for NaN or empty values in 'prompt' or 'completion'
-    if df["prompt"].isna().any() or df["completion"].isna().any():
-        print("Found NaN or empty values in 'prompt' or 'completion'")
-        print(df[df["prompt"].isna() | df["completion"].isna()])
+    directory = tempfile.mkdtemp(prefix="converter-bench-")
+    input_path = os.path.join(directory, "synthetic.csv")
+    output_path = os.path.join(directory, "synthetic.jsonl")
+
+    rng = random.Random(0)
+    vocabulary = [f"word{i}" for i in range(5000)]
+    footer = " ".join(vocabulary[:40])
+    with open(input_path, "w", encoding="utf-8") as f:
+        f.write("Title,Content\n")
+        for i in range(rows):
+            body = " ".join(rng.choice(vocabulary) for _ in range(60))
+            if i % 10 == 0:
+                body = f"{footer} item{i}"  # boilerplate page with a unique tail
+            f.write(f"Page {i},{body} ธุรกิจ\n")
+
+    dedup = Deduplicator(capacity=max(rows, 1))
+    start = time.perf_counter()
+    csv2json(input_path, output_path, chunksize, dedup)
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"{rows} rows in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s), peak RSS {peak_mb:.0f} MB, "
+        f"dedup state {dedup.nbytes / 2**20:.1f} MB"
+    )
 
 
 def main():
-    csv2json()
+    import sys
+
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        csv2json()
 
 
 if __name__ == "__main__":
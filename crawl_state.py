@@ -0,0 +1,178 @@
+"""
+Resumable, incremental re-crawls.
+
+CrawlState keeps the frontier, the seen-set and per-URL validators (ETag,
+Last-Modified, content hash and outgoing links) in one SQLite file.
+IncrementalCrawler uses it to:
+
+- resume an interrupted crawl from its checkpointed frontier,
+- send conditional requests and skip pages that return 304,
+- skip pages whose extracted content hash has not changed,
+- append only new or changed records to the output file.
+"""
+import json
+import time
+import sqlite3
+import hashlib
+from collections import deque
+from crawler import Crawler, normalize_url
+
+
+def content_hash(title, content):
+    return hashlib.sha256(f"{title}\0{content}".encode("utf-8")).hexdigest()
+
+
+class CrawlState:
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                links TEXT,
+                fetched_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS frontier (
+                position INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT UNIQUE NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS seen (url TEXT PRIMARY KEY);
+            """
+        )
+
+    def pages(self):
+        """Returns {url: (etag, last_modified, content_hash, links)}."""
+        rows = self.db.execute(
+            "SELECT url, etag, last_modified, content_hash, links FROM pages"
+        )
+        return {
+            url: (etag, last_modified, digest, json.loads(links or "[]"))
+            for url, etag, last_modified, digest, links in rows
+        }
+
+    def resume(self):
+        """Returns (frontier, seen) of an interrupted crawl, or None."""
+        frontier = [u for (u,) in self.db.execute("SELECT url FROM frontier ORDER BY position")]
+        if not frontier:
+            return None
+        seen = {u for (u,) in self.db.execute("SELECT url FROM seen")}
+        return deque(frontier), seen
+
+    def start(self, url):
+        """Begins a new crawl pass from url."""
+        with self.db:
+            self.db.execute("DELETE FROM seen")
+            self.db.execute("DELETE FROM frontier")
+            self.db.execute("INSERT INTO seen (url) VALUES (?)", (url,))
+            self.db.execute("INSERT INTO frontier (url) VALUES (?)", (url,))
+
+    def save_page(self, page, digest):
+        self.db.execute(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                page.url,
+                page.headers.get("ETag"),
+                page.headers.get("Last-Modified"),
+                digest,
+                json.dumps(sorted(page.links)),
+                time.time(),
+            ),
+        )
+
+    def checkpoint(self, url, new_links):
+        """Marks url done and queues new_links, atomically."""
+        with self.db:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO seen (url) VALUES (?)", [(u,) for u in new_links]
+            )
+            self.db.executemany(
+                "INSERT OR IGNORE INTO frontier (url) VALUES (?)", [(u,) for u in new_links]
+            )
+            self.db.execute("DELETE FROM frontier WHERE url = ?", (url,))
+
+    def close(self):
+        self.db.close()
+
+
+class IncrementalCrawler(Crawler):
+    """
+    Crawler that checkpoints to a CrawlState and only appends changed pages.
+
+    Args:
+        state_path (str): SQLite file holding the crawl state.
+        Other arguments are passed to Crawler.
+    """
+
+    def __init__(self, base_url, state_path, **kwargs):
+        super().__init__(base_url, **kwargs)
+        self.state = CrawlState(state_path)
+        self.known = self.state.pages()
+        self.unchanged = 0
+        self.changed = 0
+
+    def seed(self):
+        resumed = self.state.resume()
+        if resumed is not None:
+            print(f"Resuming crawl with {len(resumed[0])} URLs in the frontier")
+            return resumed
+        start = normalize_url(self.base_url)
+        self.state.start(start)
+        return deque([start]), {start}
+
+    def request_headers(self, url):
+        known = self.known.get(url)
+        if known is None:
+            return {}
+        etag, last_modified, _, _ = known
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def fetch_page(self, url):
+        page = super().fetch_page(url)
+        if page is not None and page.status == 304:
+            # No body on 304: follow the links recorded last time
+            page.links = self.known[url][3]
+        return page
+
+    def handle_page(self, page, out):
+        if page.status == 304:
+            self.unchanged += 1
+            return True
+
+        digest = content_hash(page.title, page.content)
+        known = self.known.get(page.url)
+        if known is not None and known[2] == digest:
+            self.unchanged += 1
+        else:
+            self.changed += 1
+            super().handle_page(page, out)
+            # Make the record durable before the state says it was written
+            out.flush()
+        self.state.save_page(page, digest)
+        self.known[page.url] = (
+            page.headers.get("ETag"),
+            page.headers.get("Last-Modified"),
+            digest,
+            list(page.links),
+        )
+        return True
+
+    def checkpoint(self, url, new_links):
+        self.state.checkpoint(url, new_links)
+
+    def crawl(self, output_file, mode="a"):
+        try:
+            stats = super().crawl(output_file, mode)
+        finally:
+            self.state.close()
+        stats.update(changed=self.changed, unchanged=self.unchanged)
+        return stats
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+"""
+Concurrent website crawler.
+
+Static pages are fetched over pooled HTTP sessions on a thread pool. Pages
+that come back as an empty JavaScript shell are re-rendered on a small pool
+of headless Chrome instances. The frontier is a deque, and a URL is marked
+seen as soon as it is queued, so it is never queued twice.
+"""
+import re
+import json
+import time
+import queue
+import logging
+import threading
+import urllib.parse
+from collections import deque, Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import requests
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+SKIPPED_EXTENSIONS = (".pdf", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".zip", ".mp4")
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "_ga", "ref"}
+CONTENT_TAGS = ["p", "h1", "h2", "h3", "h4", "h5", "h6", "li"]
+
+# A page with less text than this that ships scripts is treated as a JS shell
+JS_SHELL_TEXT_LENGTH = 200
+
+
+def normalize_url(url: str) -> str:
+    """Strips the fragment, tracking parameters and trailing slash from a URL."""
+    parts = urllib.parse.urlsplit(url.strip())
+    query = [
+        (k, v)
+        for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    ]
+    path = parts.path.rstrip("/") or "/"
+    return urllib.parse.urlunsplit(
+        (
+            parts.scheme.lower(),
+            parts.netloc.lower(),
+            path,
+            urllib.parse.urlencode(sorted(query)),
+            "",
+        )
+    )
+
+
+def clean_text(text):
+    # Remove non-printable and non-ASCII characters
+    text = re.sub(r"[^\x20-\x7E\s]", "", text)
+    # Replace multiple whitespace with a single space
+    text = re.sub(r"\s+", " ", text)
+    return text.strip()
+
+
+def extract_links(soup, base_url):
+    links = []
+    for a in soup.find_all("a", href=True):
+        href = a["href"]
+        full_url = urllib.parse.urljoin(base_url, href)
+        if full_url.startswith(base_url) and not full_url.lower().endswith(
+            SKIPPED_EXTENSIONS
+        ):
+            links.append(full_url)
+    return list(set(links))  # Remove duplicates
+
+
+def extract_page(html, base_url):
+    """Returns (title, content, links, soup) for an HTML document."""
+    soup = BeautifulSoup(html, "html.parser")
+    title = clean_text(soup.title.string if soup.title and soup.title.string else "No title")
+    content = clean_text(" ".join(p.text for p in soup.find_all(CONTENT_TAGS)))
+    return title, content, extract_links(soup, base_url), soup
+
+
+def looks_js_rendered(soup, content):
+    return len(content) < JS_SHELL_TEXT_LENGTH and soup.find("script") is not None
+
+
+class Page:
+    __slots__ = ("url", "title", "content", "links", "status", "headers", "rendered")
+
+    def __init__(self, url, title="", content="", links=(), status=200, headers=None, rendered=False):
+        self.url = url
+        self.title = title
+        self.content = content
+        self.links = links
+        self.status = status
+        self.headers = headers or {}
+        self.rendered = rendered
+
+    def record(self):
+        return {"URL": self.url, "Title": self.title, "Content": self.content}
+
+
+class BrowserPool:
+    """Lazily started pool of headless Chrome drivers for JS-heavy pages."""
+
+    def __init__(self, size=1):
+        self.size = size
+        self._drivers = queue.Queue()
+        self._started = 0
+        self._lock = threading.Lock()
+        self._all = []
+
+    def _acquire(self):
+        with self._lock:
+            if self._drivers.empty() and self._started < self.size:
+                from webScraping import setup_driver
+
+                self._started += 1
+                driver = setup_driver()
+                self._all.append(driver)
+                return driver
+        return self._drivers.get()
+
+    def render(self, url, timeout=10):
+        from webScraping import get_page_content
+
+        driver = self._acquire()
+        try:
+            return get_page_content(driver, url, timeout)
+        finally:
+            self._drivers.put(driver)
+
+    def close(self):
+        for driver in self._all:
+            driver.quit()
+        self._all = []
+
+
+class Crawler:
+    """
+    Args:
+        base_url (str): Start URL; only links under it are followed.
+        workers (int): Concurrent HTTP fetches.
+        per_host (int): Maximum concurrent fetches against one host.
+        browsers (int): Headless Chrome instances for JS-heavy pages; 0 disables.
+        timeout (float): HTTP timeout in seconds.
+    """
+
+    def __init__(self, base_url, workers=8, per_host=4, browsers=1, timeout=15):
+        self.base_url = base_url
+        self.workers = workers
+        self.per_host = per_host
+        self.timeout = timeout
+        self.browser_pool = BrowserPool(browsers) if browsers else None
+        self._local = threading.local()
+        self.pages = 0
+        self.errors = 0
+        self.rendered = 0
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.per_host)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = "Mozilla/5.0 (compatible; JVenturesCrawler/1.0)"
+        return session
+
+    def request_headers(self, url):
+        """Extra headers for a request; overridden for conditional re-crawls."""
+        return {}
+
+    def fetch_page(self, url):
+        response = self._session().get(
+            url, headers=self.request_headers(url), timeout=self.timeout
+        )
+        if response.status_code == 304:
+            return Page(url, status=304, headers=response.headers)
+        response.raise_for_status()
+        if "html" not in response.headers.get("Content-Type", "html"):
+            return None
+
+        title, content, links, soup = extract_page(response.text, self.base_url)
+        page = Page(url, title, content, links, response.status_code, response.headers)
+        if self.browser_pool is not None and looks_js_rendered(soup, content):
+            html = self.browser_pool.render(url)
+            page.title, page.content, page.links, _ = extract_page(html, self.base_url)
+            page.rendered = True
+        return page
+
+    def seed(self):
+        """Returns (frontier, seen) to start from."""
+        start = normalize_url(self.base_url)
+        return deque([start]), {start}
+
+    def handle_page(self, page, out):
+        """Writes a fetched page; returns False to skip following its links."""
+        json.dump(page.record(), out, ensure_ascii=False)
+        out.write("\n")
+        return True
+
+    def checkpoint(self, url, new_links):
+        """Called after every completed URL with the links it added to the frontier."""
+
+    def crawl(self, output_file, mode="w"):
+        frontier, seen = self.seed()
+        in_flight = {}
+        host_active = Counter()
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(self.workers) as pool, open(
+            output_file, mode, encoding="utf-8"
+        ) as out:
+            while frontier or in_flight:
+                while frontier and len(in_flight) < self.workers:
+                    url = frontier.popleft()
+                    host = urllib.parse.urlsplit(url).netloc
+                    if host_active[host] >= self.per_host:
+                        frontier.appendleft(url)
+                        break
+                    host_active[host] += 1
+                    logger.info("Visiting: %s", url)
+                    in_flight[pool.submit(self.fetch_page, url)] = url
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url = in_flight.pop(future)
+                    host_active[urllib.parse.urlsplit(url).netloc] -= 1
+                    new_links = []
+                    try:
+                        page = future.result()
+                    except Exception as e:
+                        self.errors += 1
+                        logger.warning("Error crawling %s: %s", url, e)
+                        page = None
+                    if page is not None:
+                        self.pages += 1
+                        self.rendered += page.rendered
+                        if self.handle_page(page, out):
+                            for link in page.links:
+                                link = normalize_url(link)
+                                if link not in seen:
+                                    seen.add(link)
+                                    frontier.append(link)
+                                    new_links.append(link)
+                    self.checkpoint(url, new_links)
+
+        if self.browser_pool is not None:
+            self.browser_pool.close()
+        elapsed = time.perf_counter() - start
+        return {
+            "pages": self.pages,
+            "errors": self.errors,
+            "rendered": self.rendered,
+            "seconds": round(elapsed, 2),
+            "pages_per_second": round(self.pages / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+def serve_static_site(pages=200, links_per_page=5):
+    """
+    Starts a local HTTP server with a generated site for benchmarking.
+
+    Returns:
+        (server, base_url): Call server.shutdown() when done.
+    """
+    import random
+    import tempfile
+    import functools
+    from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+    root = tempfile.mkdtemp(prefix="crawl-site-")
+    rng = random.Random(0)
+    for i in range(pages):
+        links = "".join(
+            f'<li><a href="/page{rng.randrange(pages)}.html#top?utm_source=x">link</a></li>'
+            for _ in range(links_per_page)
+        )
+        with open(f"{root}/page{i}.html", "w") as f:
+            f.write(
+                f"<html><head><title>Page {i}</title></head><body>"
+                f"<h1>Page {i}</h1><p>{'Business consulting content. ' * 20}</p>"
+                f"<ul>{links}</ul></body></html>"
+            )
+    with open(f"{root}/index.html", "w") as f:
+        f.write(
+            "<html><head><title>Home</title></head><body><ul>"
+            + "".join(f'<li><a href="/page{i}.html">p</a></li>' for i in range(0, pages, 10))
+            + "</ul></body></html>"
+        )
+
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(QuietHandler, directory=root)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def benchmark(pages=200, workers=8):
+    import os
+    import tempfile
+
+    server, base_url = serve_static_site(pages)
+    output = os.path.join(tempfile.mkdtemp(), "bench.jsonl")
+    try:
+        stats = Crawler(base_url, workers=workers, per_host=workers, browsers=0).crawl(output)
+    finally:
+        server.shutdown()
+    print(stats)
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,129 @@
+"""
+Request deadlines for the webhook pipeline.
+
+A LINE reply token is only valid for a short time after the event, so each
+event gets a Deadline when its job starts. The pipeline reads it through
+current() wherever it has to decide whether there is still time:
+
+    with scope(Deadline.for_event(event)):
+        answer = handleEvents(event, destination)
+
+Optional stages ask enough(stage) and are skipped (and counted as a
+degraded response) when less than their minimum budget is left. Stages
+that have to run get timeout(stage), which never exceeds what is left
+unless too little is left to be worth it (the answer is then pushed).
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+from tracing import increment
+
+# Seconds after the event in which the answer should be posted on the reply token
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "45"))
+
+# Minimum seconds left for an optional stage to run at all. For a required
+# stage (crew, translate) with less time than this left, the reply token is
+# given up on: the stage gets its full STAGE_TIMEOUT and the answer is pushed.
+STAGE_MIN = {
+    "crew": float(os.getenv("DEADLINE_MIN_CREW", "10")),
+    "translate": float(os.getenv("DEADLINE_MIN_TRANSLATE", "2")),
+    "grader": float(os.getenv("DEADLINE_MIN_GRADER", "20")),
+    "retrieve": float(os.getenv("DEADLINE_MIN_RETRIEVE", "3")),
+    "image": float(os.getenv("DEADLINE_MIN_IMAGE", "15")),
+    "retry": float(os.getenv("DEADLINE_MIN_RETRY", "5")),
+}
+
+# Upper bound in seconds on a single stage, whatever the deadline
+STAGE_TIMEOUT = {
+    "crew": float(os.getenv("STAGE_TIMEOUT_CREW", "40")),
+    "translate": float(os.getenv("STAGE_TIMEOUT_TRANSLATE", "8")),
+}
+
+# Time kept back for posting the reply itself
+REPLY_RESERVE = float(os.getenv("DEADLINE_REPLY_RESERVE", "2"))
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised by check() when a stage cannot finish before the deadline."""
+
+
+class Deadline:
+    """
+    Args:
+        seconds (float): Budget from now.
+    """
+
+    def __init__(self, seconds):
+        self.expires = time.monotonic() + seconds
+        # Reasons this request's answer was degraded, see degraded()
+        self.degradations = []
+
+    @classmethod
+    def for_event(cls, event, seconds=REQUEST_DEADLINE):
+        """Deadline counted from the LINE event timestamp, so queueing time is included."""
+        timestamp = event.get("timestamp")
+        if timestamp is None:
+            return cls(seconds)
+        return cls(seconds - max(0.0, time.time() - timestamp / 1000))
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0.0
+
+    def enough(self, stage):
+        return self.remaining() >= STAGE_MIN[stage]
+
+    def timeout(self, stage):
+        left = self.remaining() - REPLY_RESERVE
+        if left < STAGE_MIN[stage]:
+            return STAGE_TIMEOUT[stage]
+        return min(STAGE_TIMEOUT[stage], left)
+
+
+_local = threading.local()
+
+
+def current():
+    """The deadline of the request this thread is working on, or None."""
+    return getattr(_local, "deadline", None)
+
+
+@contextmanager
+def scope(deadline):
+    previous = current()
+    _local.deadline = deadline
+    try:
+        yield deadline
+    finally:
+        _local.deadline = previous
+
+
+def enough(stage):
+    """True if the current request (if any) still has time for an optional stage."""
+    deadline = current()
+    return deadline is None or deadline.enough(stage)
+
+
+def timeout(stage):
+    """Timeout for a stage of the current request, capped by STAGE_TIMEOUT."""
+    deadline = current()
+    if deadline is None:
+        return STAGE_TIMEOUT[stage]
+    return deadline.timeout(stage)
+
+
+def check(stage):
+    """Raises DeadlineExceeded if the current request has no time left for a stage."""
+    if not enough(stage):
+        raise DeadlineExceeded(f"Not enough time left for {stage}")
+
+
+def degraded(reason):
+    """Counts a response that skipped or cut short a stage to meet its deadline."""
+    increment("bot_degraded_responses_total", reason=reason)
+    deadline = current()
+    if deadline is not None:
+        deadline.degradations.append(reason)
@@ -0,0 +1,144 @@
+"""
+Local groundedness check of an answer against the retrieved chunks.
+
+Each answer sentence is scored against every chunk by a mix of lexical
+overlap (the share of the sentence's content words found in the chunk)
+and embedding cosine similarity, both computed as sentence x chunk NumPy
+matrices. A sentence is supported by its best chunk; the answer's score
+is the share of supported sentences.
+
+    pass        - score >= GROUNDED_PASS, the answer is sent as is
+    fail        - score <= GROUNDED_FAIL, the answer is replaced
+    borderline  - anything in between goes to the LLM hallucination grader
+"""
+import os
+import re
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from caching import TTLCache
+
+PASS = "pass"
+FAIL = "fail"
+BORDERLINE = "borderline"
+
+GROUNDED_PASS = float(os.getenv("GROUNDED_PASS", "0.8"))
+GROUNDED_FAIL = float(os.getenv("GROUNDED_FAIL", "0.4"))
+# Combined sentence/chunk score from which a sentence counts as supported
+SUPPORT_THRESHOLD = float(os.getenv("GROUNDED_SUPPORT", "0.5"))
+LEXICAL_WEIGHT = float(os.getenv("GROUNDED_LEXICAL_WEIGHT", "0.6"))
+# Sentences with fewer content words ("Here is how:") are not graded
+MIN_CONTENT_WORDS = 3
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    """
+    a an the and or but if then so of to in on at by for with from as is are was were be been being
+    it its this that these those there here you your we our they their he she his her i me my
+    can could will would should may might must do does did done have has had not no yes also
+    about into than more most very just any each all some such other which who whom what when
+    where how why up out over under again further only own same too s t don
+    """.split()
+)
+
+
+def split_sentences(text):
+    return [s.strip() for s in SENTENCE_END.split(text) if s.strip()]
+
+
+def content_words(text):
+    return {w for w in _WORD.findall(text.lower()) if w not in STOPWORDS and (len(w) > 1 or w.isdigit())}
+
+
+class Grade:
+    __slots__ = ("verdict", "score", "unsupported", "sentence_scores")
+
+    def __init__(self, verdict, score, unsupported=(), sentence_scores=()):
+        self.verdict = verdict
+        self.score = score
+        self.unsupported = list(unsupported)
+        self.sentence_scores = list(sentence_scores)
+
+    @property
+    def passed(self):
+        return self.verdict == PASS
+
+
+class GroundednessScorer:
+    """
+    Args:
+        embedder (callable): text -> vector, e.g. semantic_cache.BedrockEmbedder
+            or HashingEmbedder. Chunk vectors are cached, since retrieval
+            results repeat across questions.
+        workers (int): Concurrent embedding calls.
+    """
+
+    def __init__(self, embedder, workers=4, cache_size=4096, cache_ttl=3600.0):
+        self.embedder = embedder
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="grounding")
+
+    def _embed(self, text):
+        key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = np.asarray(self.embedder(text), dtype=np.float32)
+            self.cache.set(key, vector)
+        return vector
+
+    def embed(self, texts):
+        """Unit vectors of texts as one (len(texts), dimension) matrix."""
+        matrix = np.stack(list(self._executor.map(self._embed, texts)))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms > 0, norms, 1.0)
+
+    @staticmethod
+    def lexical_overlap(sentence_words, chunk_words):
+        """Share of each sentence's content words found in each chunk (sentences x chunks)."""
+        vocabulary = {w: i for i, w in enumerate(set().union(*sentence_words))}
+        sentences = np.zeros((len(sentence_words), len(vocabulary)), dtype=np.float32)
+        for row, words in enumerate(sentence_words):
+            sentences[row, [vocabulary[w] for w in words]] = 1.0
+        chunks = np.zeros((len(chunk_words), len(vocabulary)), dtype=np.float32)
+        for row, words in enumerate(chunk_words):
+            columns = [vocabulary[w] for w in words if w in vocabulary]
+            chunks[row, columns] = 1.0
+        return (sentences @ chunks.T) / sentences.sum(axis=1, keepdims=True)
+
+    def support(self, sentences, chunks):
+        """Best combined score of each sentence over the chunks."""
+        overlap = self.lexical_overlap(
+            [content_words(s) for s in sentences], [content_words(c) for c in chunks]
+        )
+        similarity = self.embed(sentences) @ self.embed(chunks).T
+        combined = LEXICAL_WEIGHT * overlap + (1 - LEXICAL_WEIGHT) * np.clip(similarity, 0.0, 1.0)
+        return combined.max(axis=1)
+
+    def grade(self, answer, chunks):
+        """
+        Grades an answer against the texts it should be based on.
+
+        Returns:
+            Grade: verdict, score, the unsupported sentences and each
+            graded sentence's support.
+        """
+        chunks = [c for c in chunks if c.strip()]
+        sentences = [s for s in split_sentences(answer) if len(content_words(s)) >= MIN_CONTENT_WORDS]
+        if not sentences:
+            return Grade(PASS, 1.0)
+        if not chunks:
+            # Nothing was retrieved to check against
+            return Grade(BORDERLINE, 0.0, sentences)
+
+        scores = self.support(sentences, chunks)
+        supported = scores >= SUPPORT_THRESHOLD
+        score = float(supported.mean())
+        unsupported = [s for s, ok in zip(sentences, supported) if not ok]
+        if score >= GROUNDED_PASS:
+            verdict = PASS
+        elif score <= GROUNDED_FAIL:
+            verdict = FAIL
+        else:
+            verdict = BORDERLINE
+        return Grade(verdict, score, unsupported, zip(sentences, scores.astype(float).round(3).tolist()))
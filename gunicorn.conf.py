@@ -0,0 +1,28 @@
+""" gunicorn -c gunicorn.conf.py main:app """
+import os
+
+bind = os.getenv("GUNICORN_BIND", "127.0.0.1:10000")
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+preload_app = True
+
+
+def when_ready(server):
+    # Runs in the master once the app is preloaded, before any worker forks
+    from main import preload
+
+    preload()
+
+
+def post_fork(server, worker):
+    # Clients created in the master must not be shared with forked workers
+    from clients import reset_clients
+
+    reset_clients()
+
+
+def post_worker_init(worker):
+    # Build the LLM, embeddings and every pool thread's agents before the
+    # worker takes requests
+    from main import warmup
+
+    warmup()
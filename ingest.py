@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+"""
+Parallel, incremental ingestion of Data/ into the local chunk/embedding store.
+
+1. Every file is hashed; files whose hash matches the last run are skipped.
+   The manifest also records the embedder (name, model ID, dimension), and
+   all files are re-embedded when it changes.
+2. Changed files are extracted and chunked in a process pool.
+3. Chunks are embedded in batches through embed_documents with bounded
+   concurrency.
+4. Each file's chunks and embeddings are stored as a part under
+   <index>/parts/, and the parts are assembled into the chunks.jsonl and
+   embeddings.npy that local_index.LocalIndex memory-maps. Nothing is
+   rewritten when no file was added, changed or removed.
+
+Usage:
+    python ingest.py                 # Titan embeddings
+    LOCAL_INDEX_EMBEDDER=hashing python ingest.py   # fully offline
+"""
+import os
+import json
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from local_index import DATA_DIR, INDEX_DIR, chunk_text, data_files, extract_documents
+
+EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "32"))
+EMBED_CONCURRENCY = int(os.getenv("INGEST_EMBED_CONCURRENCY", "4"))
+
+
+class StubEmbeddings:
+    """Offline stand-in for BedrockEmbeddings.embed_documents."""
+
+    def __init__(self, dimension=1024):
+        from semantic_cache import HashingEmbedder
+
+        self._embedder = HashingEmbedder(dimension)
+        self.model_id = "hashing"
+        self.dimension = dimension
+
+    def embed_documents(self, texts):
+        return [self._embedder(text) for text in texts]
+
+
+def default_embeddings():
+    if os.getenv("LOCAL_INDEX_EMBEDDER", "bedrock") == "hashing":
+        return StubEmbeddings()
+    from agents import build_embeddings
+
+    return build_embeddings()
+
+
+def embedder_info(embeddings):
+    """What the stored vectors depend on, as recorded in the manifest."""
+    model_kwargs = getattr(embeddings, "model_kwargs", None) or {}
+    return {
+        "name": type(embeddings).__name__,
+        "model_id": getattr(embeddings, "model_id", None),
+        "dimension": getattr(embeddings, "dimension", None) or model_kwargs.get("dimensions"),
+    }
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def extract_chunks(path):
+    """Runs in a worker process: returns the chunks of one file."""
+    return [
+        {"text": piece, "source": source}
+        for text, source in extract_documents(path)
+        for piece in chunk_text(text)
+    ]
+
+
+def embed_chunks(embeddings, texts, batch_size=EMBED_BATCH_SIZE, concurrency=EMBED_CONCURRENCY):
+    """Embeds texts in batches with at most `concurrency` calls in flight."""
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        vectors = [v for batch in pool.map(embeddings.embed_documents, batches) for v in batch]
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+class Ingestor:
+    def __init__(self, data_dir=DATA_DIR, index_dir=INDEX_DIR, embeddings=None, processes=None):
+        self.data_dir = data_dir
+        self.index_dir = index_dir
+        self.parts_dir = os.path.join(index_dir, "parts")
+        self.manifest_path = os.path.join(index_dir, "manifest.json")
+        self.embeddings = embeddings or default_embeddings()
+        self.processes = processes
+
+    def load_manifest(self):
+        """{"embedder": embedder_info(), "files": {path: {"hash", "chunks"}}}"""
+        if not os.path.exists(self.manifest_path):
+            return {"embedder": None, "files": {}}
+        with open(self.manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if "files" not in manifest:
+            # Written before the embedder was recorded
+            return {"embedder": None, "files": {}}
+        return manifest
+
+    def _part_path(self, digest, extension):
+        return os.path.join(self.parts_dir, f"{digest}.{extension}")
+
+    def write_part(self, digest, chunks, matrix):
+        with open(self._part_path(digest, "jsonl"), "w", encoding="utf-8") as f:
+            for chunk in chunks:
+                f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+        np.save(self._part_path(digest, "npy"), matrix)
+
+    def assemble(self, manifest):
+        """Concatenates the parts of every current file into the index files."""
+        digests = [manifest[path]["hash"] for path in sorted(manifest)]
+        parts = [np.load(self._part_path(d, "npy"), mmap_mode="r") for d in digests]
+        total = sum(len(p) for p in parts)
+        dimension = next((p.shape[1] for p in parts if len(p)), 0)
+
+        # Write next to the live files and swap them in, so processes that
+        # have the old index memory-mapped keep a consistent view
+        embeddings_path = os.path.join(self.index_dir, "embeddings.npy")
+        chunks_path = os.path.join(self.index_dir, "chunks.jsonl")
+        matrix = np.lib.format.open_memmap(
+            embeddings_path + ".tmp",
+            mode="w+",
+            dtype=np.float32,
+            shape=(total, dimension),
+        )
+        offset = 0
+        with open(chunks_path + ".tmp", "w", encoding="utf-8") as out:
+            for digest, part in zip(digests, parts):
+                with open(self._part_path(digest, "jsonl"), encoding="utf-8") as f:
+                    out.writelines(f)
+                if len(part):
+                    matrix[offset : offset + len(part)] = part
+                    offset += len(part)
+        matrix.flush()
+        del matrix
+        os.replace(embeddings_path + ".tmp", embeddings_path)
+        os.replace(chunks_path + ".tmp", chunks_path)
+        return total
+
+    def run(self):
+        start = time.perf_counter()
+        os.makedirs(self.parts_dir, exist_ok=True)
+        previous = self.load_manifest()
+        embedder = embedder_info(self.embeddings)
+        if previous["embedder"] != embedder:
+            if previous["files"]:
+                print(f"Embedder changed from {previous['embedder']} to {embedder}, re-embedding all files")
+            previous["files"] = {}
+        manifest = {}
+        changed = []
+        for path in data_files(self.data_dir):
+            digest = file_hash(path)
+            entry = previous["files"].get(path)
+            if entry and entry["hash"] == digest and os.path.exists(self._part_path(digest, "npy")):
+                manifest[path] = entry
+            else:
+                changed.append((path, digest))
+
+        chunk_count = 0
+        with ProcessPoolExecutor(max_workers=self.processes) as pool:
+            extracted = pool.map(extract_chunks, [path for path, _ in changed])
+            for (path, digest), chunks in zip(changed, extracted):
+                matrix = embed_chunks(self.embeddings, [c["text"] for c in chunks])
+                self.write_part(digest, chunks, matrix)
+                manifest[path] = {"hash": digest, "chunks": len(chunks)}
+                chunk_count += len(chunks)
+                print(f"Ingested {path}: {len(chunks)} chunks")
+
+        chunks_path = os.path.join(self.index_dir, "chunks.jsonl")
+        if changed or manifest.keys() != previous["files"].keys() or not os.path.exists(chunks_path):
+            total = self.assemble(manifest)
+            with open(self.manifest_path, "w", encoding="utf-8") as f:
+                json.dump({"embedder": embedder, "files": manifest}, f, indent=2)
+        else:
+            total = sum(entry["chunks"] for entry in manifest.values())
+
+        # Parts of files that were removed or changed are no longer referenced
+        live = {entry["hash"] for entry in manifest.values()}
+        for name in os.listdir(self.parts_dir):
+            if name.split(".")[0] not in live:
+                os.remove(os.path.join(self.parts_dir, name))
+
+        elapsed = time.perf_counter() - start
+        stats = {
+            "files": len(manifest),
+            "changed": len(changed),
+            "skipped": len(manifest) - len(changed),
+            "chunks_ingested": chunk_count,
+            "chunks_total": total,
+            "seconds": round(elapsed, 2),
+            "docs_per_second": round(len(changed) / elapsed, 2) if elapsed else 0.0,
+            "chunks_per_second": round(chunk_count / elapsed, 1) if elapsed else 0.0,
+        }
+        print(stats)
+        return stats
+
+
+if __name__ == "__main__":
+    Ingestor().run()
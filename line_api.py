@@ -0,0 +1,100 @@
+"""
+LINE Messaging API client used to deliver replies and push messages.
+
+LINE_API_BASE can point at a local stub server, and StubLineClient can
+replace the HTTP client entirely in tests.
+"""
+import os
+import json
+import threading
+import requests
+from tracing import span
+
+LINE_API_BASE = os.getenv("LINE_API_BASE", "https://api.line.me")
+
+
+class LineClient:
+    """Posts to the reply and push endpoints over one pooled HTTP session."""
+
+    def __init__(self, base_url=LINE_API_BASE, token=None, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def reply_url(self):
+        return f"{self.base_url}/v2/bot/message/reply"
+
+    @property
+    def push_url(self):
+        return f"{self.base_url}/v2/bot/message/push"
+
+    def _session(self):
+        # requests.Session is not thread-safe; keep one per worker thread
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def headers(self):
+        token = self.token or os.environ.get("LINE_TOKEN")  # edit token here
+        return {
+            "Content-Type": "application/json; charset=UTF-8",
+            "Authorization": "Bearer {}".format(token),
+        }
+
+    def _post(self, url, payload):
+        with span("line_post"):
+            return self._session().post(
+                url,
+                headers=self.headers(),
+                data=json.dumps(payload),
+                timeout=self.timeout,
+            )
+
+    def reply(self, reply_token, messages):
+        """Replies to an event with its reply token."""
+        return self._post(self.reply_url, {"replyToken": reply_token, "messages": messages})
+
+    def push(self, to, messages):
+        """Pushes messages to a user, group or room ID."""
+        return self._post(self.push_url, {"to": to, "messages": messages})
+
+
+class StubResponse:
+    status_code = 200
+    text = "{}"
+
+
+class StubLineClient:
+    """Records replies and pushes in memory instead of calling LINE."""
+
+    def __init__(self):
+        self.replies = []
+        self.pushes = []
+        self._lock = threading.Lock()
+
+    def reply(self, reply_token, messages):
+        with self._lock:
+            self.replies.append((reply_token, messages))
+        return StubResponse()
+
+    def push(self, to, messages):
+        with self._lock:
+            self.pushes.append((to, messages))
+        return StubResponse()
+
+
+def text_message(text):
+    return {"type": "text", "text": text}
+
+
+def image_message(url):
+    return {"type": "image", "originalContentUrl": url, "previewImageUrl": url}
+
+
+def push_target(event):
+    """Returns the ID to push to for an event's source, or None."""
+    source = event.get("source", {})
+    return source.get("groupId") or source.get("roomId") or source.get("userId")
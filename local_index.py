@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+"""
+Local hybrid (BM25 + vector) retrieval over the files in Data/.
+
+A drop-in alternative to the Bedrock knowledge base behind ask_expert.
+Keyword scores come from an in-memory BM25 inverted index. Semantic scores
+come from a float32 embedding matrix that is memory-mapped from disk, so
+every worker process shares the same pages. The two are fused much like
+OpenSearch/Bedrock HYBRID search, averaging a lexical and a semantic score
+in [0, 1], but on an absolute scale so that the router's thresholds mean
+the same for every query:
+
+    lexical   - BM25 over the query's content words, divided by the most
+                those words could score (idf x (k1 + 1) each, words not in
+                the corpus at the highest idf). A chunk that matches only
+                some rare words of an off-topic question stays low.
+    semantic  - cosine similarity clipped to [0, 1].
+
+Index layout (one directory):
+    chunks.jsonl    - {"text", "source"} per chunk, one per line
+    embeddings.npy  - float32 matrix, one unit-length row per chunk
+"""
+import os
+import re
+import json
+import time
+import threading
+from collections import defaultdict, deque
+import numpy as np
+from groundedness import STOPWORDS
+
+DATA_DIR = "Data"
+INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "Data/index")
+CHUNK_WORDS = 200
+CHUNK_OVERLAP = 40
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+def query_terms(query):
+    """The distinct content words of a query; stopwords say nothing about the topic."""
+    return {token for token in tokenize(query) if token not in STOPWORDS}
+
+
+def chunk_text(text, words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """Splits text into overlapping windows of `words` words."""
+    tokens = text.split()
+    step = max(1, words - overlap)
+    return [
+        " ".join(tokens[i : i + words])
+        for i in range(0, max(1, len(tokens) - overlap), step)
+        if tokens[i : i + words]
+    ]
+
+
+def extract_documents(path):
+    """Yields (text, source) units from a PDF, CSV, XLSX or JSONL file."""
+    name = os.path.basename(path)
+    if path.endswith(".pdf"):
+        from pypdf import PdfReader
+
+        for number, page in enumerate(PdfReader(path).pages, start=1):
+            yield page.extract_text() or "", f"{name}#page={number}"
+    elif path.endswith((".csv", ".xlsx")):
+        import pandas as pd
+
+        df = pd.read_csv(path) if path.endswith(".csv") else pd.read_excel(path)
+        columns = [str(c) for c in df.columns]
+        for number, row in enumerate(df.itertuples(index=False), start=1):
+            text = "; ".join(
+                f"{column}: {value}"
+                for column, value in zip(columns, row)
+                if not (isinstance(value, float) and np.isnan(value))
+            )
+            yield text, f"{name}#row={number}"
+    elif path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                text = record.get("completion") or record.get("Content") or ""
+                title = record.get("prompt") or record.get("Title") or ""
+                yield f"{title}\n{text}".strip(), record.get("URL") or name
+
+
+def data_files(data_dir=DATA_DIR):
+    return sorted(
+        os.path.join(data_dir, name)
+        for name in os.listdir(data_dir)
+        if name.endswith((".pdf", ".csv", ".xlsx", ".jsonl"))
+    )
+
+
+class LocalIndex:
+    """
+    Args:
+        chunks (list[dict]): {"text", "source"} per chunk.
+        embeddings (np.ndarray): (len(chunks), dim) float32 unit vectors.
+        embedder (callable): Maps a query to a 1-D vector.
+    """
+
+    def __init__(self, chunks, embeddings, embedder):
+        self.chunks = chunks
+        self.embeddings = embeddings
+        self.embedder = embedder
+        self._build_bm25()
+        self._latencies = deque(maxlen=10000)
+        self._lock = threading.Lock()
+
+    def _build_bm25(self):
+        postings = defaultdict(lambda: ([], []))
+        lengths = np.zeros(len(self.chunks), dtype=np.float32)
+        for doc_id, chunk in enumerate(self.chunks):
+            tokens = tokenize(chunk["text"])
+            lengths[doc_id] = len(tokens)
+            counts = defaultdict(int)
+            for token in tokens:
+                counts[token] += 1
+            for token, count in counts.items():
+                ids, tfs = postings[token]
+                ids.append(doc_id)
+                tfs.append(count)
+
+        n = max(len(self.chunks), 1)
+        # idf of a word no chunk contains
+        self.max_idf = float(np.log(1 + (n + 0.5) / 0.5))
+        self.avg_length = float(lengths.mean()) if len(lengths) else 0.0
+        self.length_norm = BM25_K1 * (
+            1 - BM25_B + BM25_B * lengths / max(self.avg_length, 1e-9)
+        )
+        self.postings = {}
+        for token, (ids, tfs) in postings.items():
+            df = len(ids)
+            idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+            self.postings[token] = (
+                np.asarray(ids, dtype=np.int32),
+                np.asarray(tfs, dtype=np.float32),
+                np.float32(idf),
+            )
+
+    def bm25_scores(self, query):
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for token in query_terms(query):
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            ids, tfs, idf = posting
+            scores[ids] += idf * tfs * (BM25_K1 + 1) / (tfs + self.length_norm[ids])
+        return scores
+
+    def lexical_scores(self, query):
+        """BM25 scores as a share of the most the query's words could score, in [0, 1)."""
+        ceiling = sum(
+            float(self.postings[token][2]) if token in self.postings else self.max_idf
+            for token in query_terms(query)
+        ) * (BM25_K1 + 1)
+        scores = self.bm25_scores(query)
+        return scores / ceiling if ceiling > 0 else scores
+
+    def vector_scores(self, query):
+        vector = np.asarray(self.embedder(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        return self.embeddings @ vector
+
+    @staticmethod
+    def _top(scores, k):
+        k = min(k, len(scores))
+        if k == 0:
+            return np.empty(0, dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def search(self, query, number_of_results=5):
+        """
+        HYBRID search. Returns the same trimmed results as agents.retrieve:
+        a list of {"text", "score", "source"} dicts, best first.
+        """
+        start = time.perf_counter()
+        if not self.chunks:
+            return []
+        lexical = self.lexical_scores(query)
+        semantic = self.vector_scores(query)
+
+        # Candidates: top hits of each list, as in OpenSearch hybrid queries
+        candidates = np.union1d(
+            self._top(lexical, number_of_results * 4),
+            self._top(semantic, number_of_results * 4),
+        )
+        fused = 0.5 * lexical[candidates] + 0.5 * np.clip(
+            semantic[candidates], 0.0, 1.0
+        )
+        order = candidates[self._top(fused, number_of_results)]
+        best = {doc_id: score for doc_id, score in zip(candidates, fused)}
+
+        results = [
+            {
+                "text": self.chunks[doc_id]["text"],
+                "score": round(float(best[doc_id]), 4),
+                "source": self.chunks[doc_id]["source"],
+            }
+            for doc_id in order
+        ]
+        with self._lock:
+            self._latencies.append(time.perf_counter() - start)
+        return results
+
+    def stats(self):
+        with self._lock:
+            latencies = np.asarray(self._latencies, dtype=np.float64)
+        if not len(latencies):
+            return {"chunks": len(self.chunks), "queries": 0}
+        return {
+            "chunks": len(self.chunks),
+            "queries": len(latencies),
+            "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+        }
+
+    @classmethod
+    def load(cls, index_dir, embedder):
+        with open(os.path.join(index_dir, "chunks.jsonl"), encoding="utf-8") as f:
+            chunks = [json.loads(line) for line in f]
+        embeddings = np.load(os.path.join(index_dir, "embeddings.npy"), mmap_mode="r")
+        return cls(chunks, embeddings, embedder)
+
+
+def default_embedder():
+    """Titan embeddings, or the local hashing embedder with LOCAL_INDEX_EMBEDDER=hashing."""
+    from semantic_cache import HashingEmbedder, BedrockEmbedder
+
+    if os.getenv("LOCAL_INDEX_EMBEDDER", "bedrock") == "hashing":
+        return HashingEmbedder()
+    from agents import build_embeddings
+
+    return BedrockEmbedder(build_embeddings)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """The process-wide LocalIndex loaded from INDEX_DIR."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = LocalIndex.load(INDEX_DIR, default_embedder())
+    return _index
+
+
+def index_stats():
+    """Query latency percentiles of the loaded index, or None if it was never used."""
+    return _index.stats() if _index is not None else None
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        from ingest import Ingestor
+
+        Ingestor().run()
+    else:
+        index = LocalIndex.load(INDEX_DIR, default_embedder())
+        for question in sys.argv[1:] or ["What is a Double Whopper?"]:
+            for result in index.search(question):
+                print(result["score"], result["source"], result["text"][:80])
+        print(index.stats())
@@ -1,9 +1,31 @@
 from pydantic import BaseModel
 import os
-from crewai import Crew, Process
-from agents import ResearchCrewAgents
-from tasks import ResearchCrewTasks
+from agents import (
+    BOT_VERBOSE,
+    ResearchCrewAgents,
+    retrieval_cache,
+    retrieval_flight,
+    retrieve,
+    answer_from_context,
+    collect_evidence,
+)
+from router import Router, Route, CREW, KB_DIRECT, NOT_FOUND_REPLY
 from dotenv import load_dotenv
+from semantic_cache import (
+    SemanticCache,
+    BedrockEmbedder,
+    HashingEmbedder,
+    normalize_question,
+)
+from caching import SingleFlight
+from groundedness import GroundednessScorer, PASS, FAIL
+import deadline
+from tracing import span, observe, increment, render as render_metrics, install_llm_callbacks
+from bedrock_limiter import install_llm_callbacks as install_llm_limiter
+import time
+import logging
+import threading
+from functools import partial
 
 
 load_dotenv(override=True)
@@ -17,34 +39,170 @@ def setup_environment():
 
 setup_environment()
 
+logger = logging.getLogger(__name__)
+
+
+CREW_MEMORY = os.getenv("CREW_MEMORY", "true").lower() == "true"
+
+# "local" grades answers with groundedness.py and only asks the LLM
+# hallucination grader about borderline ones; "llm" always asks it
+GROUNDING = os.getenv("GROUNDING", "local")
+NOT_GROUNDED_REPLY = NOT_FOUND_REPLY
+
+
+def is_not_found(output):
+    """
+    True if the crew answered with the shared not-found reply: the local
+    grader's, or the writer's or LLM grader's (tasks.py asks for it verbatim).
+    """
+    return NOT_FOUND_REPLY.rstrip(".").lower() in outputText(output).lower()
+
+_crew_agents = None
+_crew_agents_pid = None
+_crew_agents_lock = threading.Lock()
+_agent_templates = threading.local()
+
+
+def crew_agents():
+    """The worker's ResearchCrewAgents (bedrock client, LLM and embeddings)."""
+    global _crew_agents, _crew_agents_pid
+    if _crew_agents is None or _crew_agents_pid != os.getpid():
+        with _crew_agents_lock:
+            if _crew_agents is None or _crew_agents_pid != os.getpid():
+                _crew_agents = ResearchCrewAgents()
+                _crew_agents_pid = os.getpid()
+    return _crew_agents
+
+
+def agent_templates():
+    """
+    Researcher, writer and hallucination agents reused by this thread.
+
+    A Crew attaches itself to its agents while it runs, so agents are shared
+    between the questions a worker thread answers but never across threads.
+    """
+    agents = getattr(_agent_templates, "agents", None)
+    if agents is None or _agent_templates.pid != os.getpid():
+        factory = crew_agents()
+        agents = (factory.researcher(), factory.writer(), factory.hallucination())
+        _agent_templates.agents = agents
+        _agent_templates.pid = os.getpid()
+    return agents
+
+
+def preload():
+    """
+    Imports the heavy dependencies and loads the boto3 service models once,
+    in the gunicorn master (see gunicorn.conf.py), so that forked workers
+    start with them in memory.
+
+    Nothing that holds sockets, threads or SQLite connections is created
+    here; warmup() builds those in each worker.
+    """
+    import clients
+
+    start = time.perf_counter()
+    import crewai
+    import crewai_tools
+    import langchain_aws
+    import langchain_community.embeddings
+    import tasks
+
+    # Token counts and latency of every crew LLM call (imports litellm), and
+    # the Bedrock limiter for them
+    install_llm_callbacks()
+    install_llm_limiter()
+    clients.preload()
+    logger.info("Preload finished in %.2fs", time.perf_counter() - start)
+
+
+def warmup(timeout=60):
+    """
+    Builds the LLM, embeddings and agent templates before the first request.
+
+    Templates are per thread, so each job_pool thread builds its own as the
+    pool's initializer; this starts the pool and waits for them.
+    """
+    start = time.perf_counter()
+    install_llm_callbacks()
+    install_llm_limiter()
+    if not job_pool.start(timeout):
+        logger.warning("Crew warm-up still running after %ss", timeout)
+    logger.info("Crew warm-up finished in %.2fs", time.perf_counter() - start)
+
+
+def agent_tokens(agent):
+    """(prompt, completion) tokens an agent has used so far."""
+    process = getattr(agent, "_token_process", None)
+    if process is None:
+        return 0, 0
+    summary = process.get_summary()
+    if isinstance(summary, dict):
+        return summary.get("prompt_tokens", 0), summary.get("completion_tokens", 0)
+    return summary.prompt_tokens, summary.completion_tokens
+
 
 class ResearchCrew:
     def __init__(self, inputs):
+        from tasks import ResearchCrewTasks
+
         self.inputs = inputs
-        self.agents = ResearchCrewAgents()
         self.tasks = ResearchCrewTasks()
 
     def serialize_crew_output(self, crew_output):
         return {"output": crew_output}
 
-    def run(self):
-
-        researcher = self.agents.researcher()
-        writer = self.agents.writer()
-        hallucinator = self.agents.hallucination()
+    def build_crew(self):
+        researcher, writer, hallucinator = self.agents = agent_templates()
+        # One STAGE_TIMEOUT_CREW for the whole run, grader included
+        self._crew_ends = time.monotonic() + deadline.timeout("crew")
 
+        # Only the tasks are bound to the question
         research_task = self.tasks.research_task(researcher, self.inputs)
-        writing_task = self.tasks.writing_task(writer, [research_task], self.inputs)
-        hallucination_task = self.tasks.hallucination_task(
-            hallucinator, [writing_task], self.inputs
-        )
-
-        crew = Crew(
-            agents=[researcher, writer, hallucinator],
-            tasks=[research_task, writing_task, hallucination_task],
+        self.writing_task = self.tasks.writing_task(writer, [research_task], self.inputs)
+        agents = [researcher, writer]
+        tasks = [research_task, self.writing_task]
+        if GROUNDING == "llm":
+            if deadline.enough("grader"):
+                agents.append(hallucinator)
+                tasks.append(
+                    self.tasks.hallucination_task(hallucinator, [self.writing_task], self.inputs)
+                )
+            else:
+                deadline.degraded("grader_skipped")
+        return self._crew(agents, tasks)
+
+    def build_grader_crew(self):
+        """The LLM hallucination grader alone, over the finished writing task."""
+        hallucinator = self.agents[2]
+        task = self.tasks.hallucination_task(hallucinator, [self.writing_task], self.inputs)
+        return self._crew([hallucinator], [task])
+
+    def crew_left(self):
+        return max(0.0, self._crew_ends - time.monotonic())
+
+    def share_budget(self):
+        """Splits what is left of the crew's budget evenly over the tasks still to run."""
+        if not self._pending:
+            return
+        # The templates belong to this thread, so the limit only affects this run
+        limit = max(1, int(self.crew_left() / len(self._pending)))
+        for agent in self._pending:
+            agent.max_execution_time = limit
+
+    def _crew(self, agents, tasks):
+        from crewai import Crew, Process
+
+        # One agent per task; each finished task hands its unused time on
+        self._pending = list(agents)
+        self.share_budget()
+
+        return Crew(
+            agents=agents,
+            tasks=tasks,
             process=Process.sequential,
-            verbose=True,
-            memory=True,
+            verbose=BOT_VERBOSE,
+            memory=CREW_MEMORY,
             embedder={
                 "provider": "aws_bedrock",
                 "config": {
@@ -52,11 +210,105 @@ class ResearchCrew:
                     "vector_dimension": 1024,
                 },
             },
+            task_callback=self.task_done,
         )
-        self.result = crew.kickoff(inputs=self.inputs)
+
+    def task_done(self, output):
+        # Tasks run one after another, so each one took the time since the last
+        now = time.perf_counter()
+        observe("bot_stage_seconds", now - self._task_started, stage=f"task:{output.agent}")
+        self._task_started = now
+        if self._pending:
+            self._pending.pop(0)
+            self.share_budget()
+
+        # Agents are reused by this thread, so a task's tokens are the growth
+        # of its agent's running total
+        for agent in self.agents:
+            if agent.role != output.agent:
+                continue
+            prompt, completion = agent_tokens(agent)
+            before = self._tokens.get(agent.role, (0, 0))
+            prompt, completion = prompt - before[0], completion - before[1]
+            self._tokens[agent.role] = (prompt + before[0], completion + before[1])
+            increment("bot_task_tokens_total", prompt, task=agent.role, kind="prompt")
+            increment("bot_task_tokens_total", completion, task=agent.role, kind="completion")
+            logger.info("Task %r used %d prompt and %d completion tokens", agent.role, prompt, completion)
+
+    def grade(self, result, evidence):
+        """Checks the written answer against the passages the tools returned."""
+        with span("grounding"):
+            grade = grounding.grade(outputText(result), evidence)
+        increment("bot_grounding_total", verdict=grade.verdict)
+        # Only answers that passed the local check are cached
+        self.grounded = grade.verdict == PASS
+        if grade.verdict == PASS:
+            return result
+        if grade.verdict == FAIL:
+            logger.info("Answer not grounded (%.2f); unsupported: %s", grade.score, grade.unsupported)
+            return NOT_GROUNDED_REPLY
+        # The grader gets what the researcher and writer left of the crew's budget
+        if not deadline.enough("grader") or self.crew_left() < deadline.STAGE_MIN["grader"]:
+            deadline.degraded("grader_skipped")
+            return result
+        with span("crew_grader"):
+            self._task_started = time.perf_counter()
+            return self.build_grader_crew().kickoff(inputs=self.inputs)
+
+    def run(self):
+        # With GROUNDING=llm the grader task in the crew vouches for the answer
+        self.grounded = GROUNDING == "llm"
+        crew = self.build_crew()
+        self._tokens = {agent.role: agent_tokens(agent) for agent in self.agents}
+        evidence = collect_evidence()
+        with span("crew_kickoff"):
+            self._task_started = time.perf_counter()
+            self.result = crew.kickoff(inputs=self.inputs)
+        if GROUNDING == "local":
+            self.result = self.grade(self.result, evidence)
 
         self.serialized_result = self.serialize_crew_output(self.result)
-        return {"result": self.serialized_result}
+        return {
+            "result": self.serialized_result,
+            "grounded": self.grounded,
+            # Nothing to illustrate when nothing was found
+            "image": not is_not_found(self.result),
+        }
+
+
+def benchmark_construction(iterations=20):
+    """Per-request construction cost with and without reused agent templates."""
+    from crewai import Crew, Process
+    from tasks import ResearchCrewTasks
+
+    inputs = {"question": "What is a Double Whopper?"}
+    tasks = ResearchCrewTasks()
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        factory = ResearchCrewAgents()
+        researcher = factory.researcher()
+        writer = factory.writer()
+        hallucinator = factory.hallucination()
+        research_task = tasks.research_task(researcher, inputs)
+        writing_task = tasks.writing_task(writer, [research_task], inputs)
+        hallucination_task = tasks.hallucination_task(hallucinator, [writing_task], inputs)
+        Crew(
+            agents=[researcher, writer, hallucinator],
+            tasks=[research_task, writing_task, hallucination_task],
+            process=Process.sequential,
+            memory=CREW_MEMORY,
+        )
+    before = (time.perf_counter() - start) / iterations
+
+    agent_templates()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        ResearchCrew(inputs).build_crew()
+    after = (time.perf_counter() - start) / iterations
+
+    print(f"rebuild everything per request: {before * 1000:.1f} ms")
+    print(f"reuse agent templates:          {after * 1000:.1f} ms")
 
 
 class QuestionRequest(BaseModel):
@@ -77,15 +329,28 @@ def has_useful_information(result):
     return "Agent stopped due to iteration limit or time limit" not in result
 
 
-from flask import Flask, request
+from flask import Flask, request, jsonify
 import os
-import json
-import requests
+from worker_pool import pool_from_env, DROP_OLDEST
+from bedrock_limiter import get_limiter
+from line_api import LineClient, text_message, image_message, push_target
+from conversation_store import store_from_env
+from local_index import index_stats as local_index_stats
 
 # ------------ end import zone -----------
 
 app = Flask(__name__)
 
+# Background pool that runs the crew pipeline so the webhook can ack right away;
+# each thread builds its agent templates when it starts (see warmup())
+job_pool = pool_from_env(initializer=agent_templates)
+
+# Busy replies are posted from their own small pool so that a slow LINE API
+# never holds up the webhook's ack; stale ones are dropped first
+busy_pool = pool_from_env("BUSY_POOL", workers=2, policy=DROP_OLDEST)
+
+BUSY_MESSAGE = "Sorry, we are handling a lot of questions right now. Please try again in a moment."
+
 
 @app.route("/")
 def hello():
@@ -99,147 +364,324 @@ def hello():
 # for checking that the request
 def webhook():
     req = request.json
-    print("request coming from line")
-    print(req)
+    if BOT_VERBOSE:
+        logger.info("request coming from line: %s", req)
     if len(req["events"]) == 0:
         return "", 200
 
+    # Acknowledge LINE immediately; the crew runs on the worker pool
     handleRequest(req)
     return "", 200
 
 
-from agents import generate_image
+@app.route("/metrics")
+def metrics():
+    return render_metrics(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+
+@app.route("/pool")
+def pool_stats():
+    limiter = get_limiter()
+    return jsonify(
+        {
+            "jobs": job_pool.stats(),
+            "images": image_pool.stats(),
+            "busy_replies": busy_pool.stats(),
+            "bedrock": limiter.stats() if limiter is not None else None,
+        }
+    )
+
+
+@app.route("/cache")
+def cache_stats():
+    return jsonify(
+        {
+            "semantic": semantic_cache.stats(),
+            "retrieval": retrieval_cache.stats(),
+            "retrieval_flight": retrieval_flight.stats(),
+            # "coalesced" is the number of crew runs saved
+            "question_flight": question_flight.stats(),
+            "routes": router.stats(),
+            "translation": translator.stats(),
+            # p50/p99 search latency with RETRIEVAL_BACKEND=local
+            "local_index": local_index_stats(),
+        }
+    )
+
+
+from agents import generate_image, render_request, ImagePending
+
+
+# Replaceable with line_api.StubLineClient() for local testing
+line_client = LineClient()
+
+# "push" sends the text on the reply token first and pushes the image later;
+# "inline" waits for the image and replies with both messages together
+IMAGE_DELIVERY = os.getenv("IMAGE_DELIVERY", "push")
+image_pool = pool_from_env("IMAGE_POOL")
+
+
+def replyMessages(replyToken, messages):
+    return line_client.reply(replyToken, messages)
+
+
+def replyBusy(replyToken):
+    r = replyMessages(replyToken, [text_message(BUSY_MESSAGE)])
+    logger.debug("Response for busy reply: %s", r.text)
 
 
 def handleRequest(req):
-    token = os.environ.get("LINE_TOKEN")  # edit token here
-    reply_url = "https://api.line.me/v2/bot/message/reply"
-    Authorization = "Bearer {}".format(token)
-
-    headers = {
-        "Content-Type": "application/json; charset=UTF-8",
-        "Authorization": Authorization,
-    }
-
-    response = handleEvents(req["events"][0], req["destination"])
-    replyToken = req["events"][0]["replyToken"]
-
-    if "cannot find relevant information" in response:
-        data = json.dumps(
-            {
-                "replyToken": replyToken,
-                "messages": [
-                    {
-                        "type": "text",
-                        "text": response,
-                    }
-                ],
-            }
+    """
+    Dispatches every event in a webhook delivery to the worker pool.
+
+    LINE batches several events into one delivery under load, so each event
+    becomes its own job and is answered on its own reply token. A failure or
+    slow crew run in one event does not hold up the others.
+    """
+    destination = req.get("destination")
+    for event in req["events"]:
+        replyToken = event.get("replyToken")
+        if replyToken is None:
+            # e.g. unfollow events cannot be replied to
+            continue
+        try:
+            job_pool.submit(
+                handleEventRequest,
+                event,
+                destination,
+                on_drop=lambda token=replyToken: busy_pool.submit(replyBusy, token),
+            )
+        except Exception as e:
+            logger.warning("Webhook job rejected: %s", e)
+
+
+def pushImage(to, response, request=None):
+    # request: the Titan request an inline attempt prepared before running out of time
+    image_url = render_request(request) if request is not None else generate_image(str(response))
+    logger.debug("Generated image URL: %s", image_url)
+    r = line_client.push(to, [image_message(image_url)])
+    logger.debug("LINE push API Response: %s", r.text)
+
+
+def deliver(event, messages, request_deadline):
+    """Replies on the event's reply token, or pushes once the token has likely expired."""
+    to = push_target(event)
+    if request_deadline.expired() and to is not None:
+        deadline.degraded("push_fallback")
+        return line_client.push(to, messages)
+    return replyMessages(event["replyToken"], messages)
+
+
+def handleEventRequest(event, destination):
+    request_deadline = deadline.Deadline.for_event(event)
+    with deadline.scope(request_deadline):
+        response, with_image = handleEvents(event, destination)
+
+        if not with_image:
+            r = deliver(event, [text_message(response)], request_deadline)
+            logger.debug("LINE API Response: %s", r.text)
+            return
+
+        to = push_target(event)
+        if IMAGE_DELIVERY == "push" and to is not None:
+            # Text first, image follows through the push API
+            r = deliver(event, [text_message(response)], request_deadline)
+            logger.debug("LINE API Response: %s", r.text)
+            image_pool.submit(pushImage, to, response)
+            return
+
+        try:
+            image_url = generate_image(str(response))
+        except deadline.DeadlineExceeded as e:
+            # Not enough time to render inline: text now, image pushed later
+            r = deliver(event, [text_message(response)], request_deadline)
+            logger.debug("LINE API Response: %s", r.text)
+            if to is not None:
+                deadline.degraded("image_deferred")
+                request = e.request if isinstance(e, ImagePending) else None
+                image_pool.submit(pushImage, to, response, request)
+            else:
+                deadline.degraded("image_skipped")
+            return
+
+        logger.debug("Generated image URL: %s", image_url)
+
+        r = deliver(
+            event, [text_message(response), image_message(image_url)], request_deadline
         )
-        r = requests.post(reply_url, headers=headers, data=data)
-        print(f"Response for no information: {r.text}")  # Log response
-    else:
-        image_url = generate_image(str(response))
-
-        print(f"Generated image URL: {image_url}")  # Debug: check generated URL
-
-        data = json.dumps(
-            {
-                "replyToken": replyToken,
-                "messages": [
-                    {
-                        "type": "text",
-                        "text": response,
-                    },
-                    {
-                        "type": "image",
-                        "originalContentUrl": image_url,
-                        "previewImageUrl": image_url,
-                    },
-                ],
-            }
-        )
-
-        r = requests.post(reply_url, headers=headers, data=data)
-        print(f"LINE API Response: {r.text}")  # Debug: check LINE API response
+        logger.debug("LINE API Response: %s", r.text)
 
 
-chat_conver = {}
+# Bounded history keyed by the LINE user/group/room, shared across workers
+# when CONVERSATION_STORE=sqlite
+conversations = store_from_env()
 
 
 def handleEvents(event, destination):
-    if destination not in chat_conver:
-        chat_conver[destination] = []
-
-    if event["message"]["type"] == "text":
-        return handleMessage(event["message"], destination)
+    """Returns the reply text and whether an image should be generated for it."""
+    if event.get("type") == "message" and event["message"]["type"] == "text":
+        # destination is the bot ID; fall back to it only for sourceless events
+        conversation = push_target(event) or destination
+        return handleMessage(event["message"], conversation)
     else:
-        print(f"Unknown event type: {event['type']}")
-        return "sorry unknown type format we still can't handle this type of message"
+        logger.info("Unknown event type: %s", event.get("type"))
+        return "sorry unknown type format we still can't handle this type of message", False
 
 
-from langdetect import detect
-from deep_translator import GoogleTranslator
+from translation import detect_language, service_from_env as translation_from_env
 
+# Replaceable with TranslationService(DictionaryBackend()) for local testing
+translator = translation_from_env()
 
-def handleMessage(event, destination):
 
-    all_language = {
-        "en": "en",
-        "th": "th",
-    }
+def handleMessage(event, conversation):
     textFromUser = event["text"]
-    new_message = {"type": "msg", "msg": textFromUser}
-    lang = detect(textFromUser)
-    # output = Translator().translate(textFromUser, dest=f'{all_language[lang]}').text
-
-    print("chat convert destination")
-    print(chat_conver[destination])
-    # translated = GoogleTranslator(source='auto', target='de').translate("keep it up, you are awesome")
-    if len(chat_conver[destination]) == 0:
-        # Initialize chat_conver[destination] if it doesn't exist
-        chat_conver[destination] = []
-        chat_conver[destination].append(new_message)
-        inputs = textFromUser
-        result = ask_question(inputs)
-        result = (
-            result["result"]["output"]
-            .raw.replace("yes.", "")
-            .replace("yes", "")
-            .replace("Yes.", "")
-            .strip()
-        )
-        print("result returning from latest message text", result)
-        if lang == "th":
-            return GoogleTranslator(source="auto", target="th").translate(result[""])
-        else:
-            return result
-    else:
-        chat_conver[destination].append(new_message)
-        inputs = textFromUser
-        result = ask_question(inputs)
-        result = (
-            result["result"]["output"]
-            .raw.replace("yes.", "")
-            .replace("yes", "")
-            .replace("Yes.", "")
-            .strip()
-        )
-        print("result returning from latest message text", result)
-        if lang == "th":
-            return GoogleTranslator(source="auto", target="th").translate(result)
-        else:
-            return result
+    with span("detect_language"):
+        lang = detect_language(textFromUser)
+
+    conversations.append(conversation, "user", textFromUser)
+    answer = ask_question(textFromUser)
+    result = (
+        outputText(answer["result"]["output"])
+        .replace("yes.", "")
+        .replace("yes", "")
+        .replace("Yes.", "")
+        .strip()
+    )
+    if BOT_VERBOSE:
+        logger.info("result returning from latest message text: %s", result)
+    if lang == "th":
+        with span("translate"):
+            # Retry failed chunks only while there is time; anything not
+            # translated in time is sent in English
+            result = translator.translate(
+                result,
+                "th",
+                timeout=deadline.timeout("translate"),
+                retries=1 if deadline.enough("retry") else 0,
+            )
+    conversations.append(conversation, "assistant", result)
+    return result, answer.get("image", True)
+
+
+def outputText(output):
+    # CrewOutput carries the answer in .raw; cached and error outputs are str
+    return getattr(output, "raw", output)
+
+
+def buildSemanticCache():
+    if os.getenv("SEMANTIC_CACHE_EMBEDDER", "bedrock") == "hashing":
+        return SemanticCache(HashingEmbedder())
+    # Reuses the Titan embeddings the crew agents already build
+    return SemanticCache(BedrockEmbedder(lambda: crew_agents().embeddings))
+
+
+semantic_cache = buildSemanticCache()
+
+# Local check of crew answers against the retrieved passages; shares the
+# semantic cache's embedder
+grounding = GroundednessScorer(semantic_cache.embedder)
+
+
+# Concurrent duplicates of the same question share one crew run
+question_flight = SingleFlight()
+QUESTION_COALESCE_MAX_WAIT = float(os.getenv("QUESTION_COALESCE_MAX_WAIT", "120"))
+
+# Greetings, out-of-scope and confident KB hits skip the crew
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "true").lower() == "true"
+router = Router(retrieve, answer_from_context)
+
+
+def runCrew(question, vector=None):
+    start = time.perf_counter()
+    request_deadline = deadline.current()
+    degradations = len(request_deadline.degradations) if request_deadline else 0
+    research_crew = ResearchCrew({"question": question})
+    result = research_crew.run()
+    answer = outputText(result["result"]["output"])
+    # Answers cut short by the deadline or not known to be grounded are not
+    # worth serving to everyone who asks next
+    degraded = request_deadline is not None and len(request_deadline.degradations) > degradations
+    if result.get("grounded") and not degraded and has_useful_information(answer) and vector is not None:
+        semantic_cache.put(question, answer, time.perf_counter() - start, vector=vector)
+    return result
+
+
+def answerDirect(question, route, vector=None):
+    """The router's single-call answer for a KB_DIRECT route, cached like crew answers."""
+    start = time.perf_counter()
+    try:
+        answer = router.answer_direct(route, question)
+    except Exception as e:
+        logger.warning("Direct answer failed, escalating to crew: %s", e)
+        return runCrew(question, vector)
+    if not is_not_found(answer) and vector is not None:
+        semantic_cache.put(question, answer, time.perf_counter() - start, vector=vector)
+    # Direct answers are sent without a generated image
+    return {"result": {"output": answer}, "image": False}
 
 
 def ask_question(question):
+    """
+    Answers a question from the semantic cache, a router fast path or the crew.
+
+    Returns:
+        dict: {"result": {"output": answer}, "image": bool}; "image" is False
+        for answers that should be sent without a generated image.
+    """
+    start = time.perf_counter()
+    # Greetings are answered before the cache lookup pays for an embedding
+    route = router.greeting(question) if ROUTER_ENABLED else None
+    if route is not None:
+        router.record(route, question, time.perf_counter() - start)
+        return {"result": {"output": route.answer}, "image": False}
+
+    try:
+        cached, vector = semantic_cache.get(question)
+        if cached is not None:
+            logger.info("semantic cache hit")
+            return {"result": {"output": cached}, "image": True}
+    except Exception as e:
+        logger.warning("Semantic cache lookup failed: %s", e)
+        vector = None
+
+    start = time.perf_counter()
+    route = router.route(question) if ROUTER_ENABLED else Route(CREW)
+    if route.answer is not None:
+        router.record(route, question, time.perf_counter() - start)
+        # Canned answers are sent without a generated image
+        return {"result": {"output": route.answer}, "image": False}
+
+    # Concurrent duplicates share one direct answer or crew run
+    if route.name == KB_DIRECT:
+        run = partial(answerDirect, question, route, vector)
+    else:
+        run = partial(runCrew, question, vector)
+    key = normalize_question(question)
+    # Wait for a shared run no longer than this request has left
+    request_deadline = deadline.current()
+    wait = QUESTION_COALESCE_MAX_WAIT
+    if request_deadline is not None:
+        wait = min(wait, request_deadline.remaining())
     try:
-        research_crew = ResearchCrew({"question": question})
-        result = research_crew.run()
-        return result
+        try:
+            return question_flight.do(key, run, timeout=wait)
+        except TimeoutError:
+            if wait < QUESTION_COALESCE_MAX_WAIT and not deadline.enough("crew"):
+                # Too late for a crew run of our own to make the reply token;
+                # the answer is pushed, so keep following the shared run
+                deadline.degraded("coalesce_wait")
+                try:
+                    return question_flight.do(key, run, timeout=QUESTION_COALESCE_MAX_WAIT - wait)
+                except TimeoutError:
+                    pass
+            # The shared run is taking too long; answer this user on our own
+            return run()
     except Exception as e:
-        print(f"Error during question handling: {e}")
-        return {"result": {"output": "An error occurred during processing."}}
+        logger.exception("Error during question handling: %s", e)
+        return {"result": {"output": "An error occurred during processing."}, "image": False}
+    finally:
+        router.record(route, question, time.perf_counter() - start)
 
 
 # ------------ end edit zone  --------
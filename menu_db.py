@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+"""
+Structured lookups over the Burger King menu and the nutrition table.
+
+Both tables are loaded once per process into an in-memory SQLite database
+with indexes on the normalized item name and on calories, so exact numeric
+questions ("calories in a Double Whopper", "burgers under 500 kcal") are
+answered in milliseconds without a knowledge-base round trip.
+"""
+import os
+import re
+import sqlite3
+import difflib
+import threading
+from groundedness import STOPWORDS
+
+MENU_CSV = "Data/burger-king-menu.csv"
+NUTRITION_XLSX = "Data/nutrition.xlsx"
+MENU_DB = os.getenv("MENU_DB", "Data/menu.db")
+MAX_ROWS = 10
+# difflib ratio a misspelled word must reach; at 0.6 "salads" matched "lard"
+FUZZY_CUTOFF = float(os.getenv("MENU_FUZZY_CUTOFF", "0.8"))
+
+MENU_COLUMNS = {
+    "Item": "item",
+    "Category": "category",
+    "Calories": "calories",
+    "Fat Calories": "fat_calories",
+    "Fat (g)": "fat_g",
+    "Saturated Fat (g)": "saturated_fat_g",
+    "Trans Fat (g)": "trans_fat_g",
+    "Cholesterol (mg)": "cholesterol_mg",
+    "Sodium (mg)": "sodium_mg",
+    "Total Carb (g)": "carbs_g",
+    "Dietary Fiber (g)": "fiber_g",
+    "Sugars (g)": "sugars_g",
+    "Protein (g)": "protein_g",
+}
+NUTRITION_COLUMNS = {
+    "name": "item",
+    "serving_size": "serving_size",
+    "calories": "calories",
+    "total_fat": "fat_g",
+    "saturated_fat": "saturated_fat_g",
+    "cholesterol": "cholesterol_mg",
+    "sodium": "sodium_mg",
+    "carbohydrate": "carbs_g",
+    "fiber": "fiber_g",
+    "sugars": "sugars_g",
+    "protein": "protein_g",
+}
+NUTRIENTS = {
+    "calorie": "calories",
+    "kcal": "calories",
+    "cal": "calories",
+    "protein": "protein_g",
+    "fat": "fat_g",
+    "sodium": "sodium_mg",
+    "salt": "sodium_mg",
+    "sugar": "sugars_g",
+    "carb": "carbs_g",
+    "fiber": "fiber_g",
+    "cholesterol": "cholesterol_mg",
+}
+
+_FILTER = re.compile(
+    r"(under|below|less than|fewer than|at most|<=?|over|above|more than|at least|>=?)"
+    r"\s*(\d+(?:\.\d+)?)\s*(g|mg|kcal|cal\w*|protein|fat|sodium|sugar\w*|carb\w*|fiber)?",
+    re.IGNORECASE,
+)
+_FILLER = re.compile(
+    r"\b(how many|how much|what is|what's|what are|the|in|of|a|an|does|do|have|has|"
+    r"calories?|kcal|nutrition|nutrients?|facts?|protein|fat|sodium|sugars?|carbs?|"
+    r"fiber|cholesterol|info(rmation)?|burger king|bk)\b",
+    re.IGNORECASE,
+)
+# Words a filter question may use besides a category: "menu items under 300 kcal"
+_FILTER_WORDS = frozenset("item items food foods menu option options thing things show list give find get g mg".split())
+
+
+def normalize_name(name):
+    name = re.sub(r"[®™]", "", str(name)).lower()
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", name)).strip()
+
+
+def parse_number(value):
+    """Parses numbers like 72, '72g' or '9.00 mg'; returns None for blanks."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return None if value != value else float(value)
+    match = re.search(r"-?\d+(?:\.\d+)?", str(value))
+    return float(match.group()) if match else None
+
+
+class MenuDatabase:
+    """
+    Args:
+        path (str): SQLite file the tables are cached in. It is rebuilt when
+            missing or older than the source files, and copied into memory
+            on load.
+    """
+
+    def __init__(self, path=MENU_DB, menu_csv=MENU_CSV, nutrition_xlsx=NUTRITION_XLSX):
+        sources = [p for p in (menu_csv, nutrition_xlsx) if os.path.exists(p)]
+        if not os.path.exists(path) or os.path.getmtime(path) < max(
+            os.path.getmtime(p) for p in sources
+        ):
+            self._build(path, menu_csv, nutrition_xlsx)
+
+        self.db = sqlite3.connect(":memory:", check_same_thread=False)
+        with sqlite3.connect(path) as disk:
+            disk.backup(self.db)
+        self.db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+
+        self.name_list = [r[0] for r in self.db.execute("SELECT DISTINCT name_key FROM items")]
+        self.name_words = sorted({word for name in self.name_list for word in name.split()})
+        self._name_word_set = frozenset(self.name_words)
+        self.categories = sorted(
+            {
+                normalize_name(r[0])
+                for r in self.db.execute(
+                    "SELECT DISTINCT category FROM items WHERE source = 'menu' AND category IS NOT NULL"
+                )
+            }
+        )
+
+    def _build(self, path, menu_csv, nutrition_xlsx):
+        import pandas as pd
+
+        columns = sorted(set(MENU_COLUMNS.values()) | set(NUTRITION_COLUMNS.values()))
+        numeric = [c for c in columns if c not in ("item", "category", "serving_size")]
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        db = sqlite3.connect(tmp_path)
+        db.execute(
+            "CREATE TABLE items (source TEXT, name_key TEXT, item TEXT, category TEXT, "
+            "serving_size TEXT, " + ", ".join(f"{c} REAL" for c in numeric) + ")"
+        )
+        db.execute("CREATE INDEX items_name ON items (name_key)")
+        db.execute("CREATE INDEX items_calories ON items (source, calories)")
+
+        menu = pd.read_csv(menu_csv).rename(columns=MENU_COLUMNS)
+        self._insert(db, "menu", menu, numeric)
+        if os.path.exists(nutrition_xlsx):
+            nutrition = pd.read_excel(nutrition_xlsx).rename(columns=NUTRITION_COLUMNS)
+            self._insert(db, "nutrition", nutrition, numeric)
+        db.commit()
+        db.close()
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _insert(db, source, df, numeric):
+        rows = []
+        for record in df.to_dict("records"):
+            rows.append(
+                (
+                    source,
+                    normalize_name(record.get("item", "")),
+                    record.get("item"),
+                    record.get("category"),
+                    None if record.get("serving_size") is None else str(record.get("serving_size")),
+                    *[parse_number(record.get(c)) for c in numeric],
+                )
+            )
+        placeholders = ", ".join("?" for _ in range(5 + len(numeric)))
+        db.executemany(f"INSERT INTO items VALUES ({placeholders})", rows)
+
+    def _rows(self, sql, params):
+        with self._lock:
+            rows = self.db.execute(sql, params).fetchall()
+        return [{k: row[k] for k in row.keys() if row[k] is not None} for row in rows]
+
+    def correct_words(self, key):
+        """
+        The content words of `key`, each replaced by the closest word of an
+        item name if it is not one. None if a word has no close match.
+        """
+        words = []
+        for word in key.split():
+            if word in STOPWORDS:
+                continue
+            if word not in self._name_word_set:
+                matches = difflib.get_close_matches(word, self.name_words, n=1, cutoff=FUZZY_CUTOFF)
+                if not matches:
+                    return None
+                word = matches[0]
+            words.append(word)
+        return words or None
+
+    def lookup(self, name, limit=3):
+        """
+        Items whose name matches `name` exactly or by prefix, else items whose
+        name has every word of `name` once typos are corrected ("whoper with
+        chese"). Nothing is returned for words no item name comes close to.
+
+        An item listed in both tables (or twice in one) is returned once,
+        from the row loaded first, i.e. the menu.
+        """
+        key = normalize_name(name)
+        if not key:
+            return []
+        rows = self._rows(
+            "SELECT * FROM items WHERE rowid IN "
+            "(SELECT min(rowid) FROM items WHERE name_key = ? OR name_key LIKE ? GROUP BY name_key) "
+            "ORDER BY source, length(name_key) LIMIT ?",
+            (key, f"{key}%", limit),
+        )
+        if rows:
+            return rows
+        words = self.correct_words(key)
+        if not words:
+            return []
+        clauses = " AND ".join("(' ' || name_key || ' ') LIKE ?" for _ in words)
+        return self._rows(
+            "SELECT * FROM items WHERE rowid IN "
+            f"(SELECT min(rowid) FROM items WHERE {clauses} GROUP BY name_key) "
+            "ORDER BY source, length(name_key) LIMIT ?",
+            [f"% {word} %" for word in words] + [limit],
+        )
+
+    def filter(self, nutrient="calories", maximum=None, minimum=None, category=None, source="menu", limit=MAX_ROWS):
+        """
+        Items with `nutrient` between minimum and maximum, highest first,
+        each name once as in lookup().
+        """
+        if nutrient not in set(NUTRIENTS.values()):
+            raise ValueError(f"Unknown nutrient: {nutrient}")
+        clauses = ["source = ?", f"{nutrient} IS NOT NULL"]
+        params = [source]
+        if maximum is not None:
+            clauses.append(f"{nutrient} <= ?")
+            params.append(maximum)
+        if minimum is not None:
+            clauses.append(f"{nutrient} >= ?")
+            params.append(minimum)
+        if category:
+            clauses.append("lower(category) = ?")
+            params.append(category)
+        params.append(limit)
+        return self._rows(
+            "SELECT * FROM items WHERE rowid IN "
+            f"(SELECT min(rowid) FROM items WHERE {' AND '.join(clauses)} GROUP BY name_key) "
+            f"ORDER BY {nutrient} DESC LIMIT ?",
+            params,
+        )
+
+    def find_category(self, words):
+        """
+        The category named by one of `words`, singular or plural, allowing
+        for typos. Returns "" if the words name something else (e.g.
+        "drinks"), and None if they name nothing at all.
+        """
+        singular = {c.rstrip("s"): c for c in self.categories}
+        for word in words:
+            matches = difflib.get_close_matches(word.rstrip("s"), singular, n=1, cutoff=FUZZY_CUTOFF)
+            if matches:
+                return singular[matches[0]]
+        return "" if words else None
+
+    def query(self, text):
+        """
+        Answers a free-text menu/nutrition question with matching rows.
+
+        "under 500 kcal", "burgers with more than 30g protein" -> filter()
+        "drinks under 200 kcal" (no such category)          -> []
+        anything else -> lookup() of the item name in the text
+        """
+        match = _FILTER.search(text)
+        if match:
+            word, number, unit = match.groups()
+            nutrient = "calories"
+            for hint, column in NUTRIENTS.items():
+                if hint in (unit or "").lower() or re.search(rf"\b{hint}", text.lower()):
+                    nutrient = column
+                    break
+            upper = word.lower() in ("under", "below", "less than", "fewer than", "at most", "<", "<=")
+            # Whole words only: "burger" but not "cheeseburgers"
+            rest = normalize_name(_FILLER.sub(" ", _FILTER.sub(" ", text)))
+            words = [w for w in rest.split() if w not in STOPWORDS and w not in _FILTER_WORDS]
+            category = self.find_category(words)
+            if category == "":
+                # Something the menu has no category for; every item would be wrong
+                return []
+            return self.filter(
+                nutrient,
+                maximum=float(number) if upper else None,
+                minimum=None if upper else float(number),
+                category=category,
+            )
+        return self.lookup(_FILLER.sub(" ", text))
+
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def get_database():
+    """The process-wide MenuDatabase, loaded on first use."""
+    global _database
+    if _database is None:
+        with _database_lock:
+            if _database is None:
+                _database = MenuDatabase()
+    return _database
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    database = get_database()
+    for question in sys.argv[1:] or [
+        "calories in a Double Whopper",
+        "burgers under 500 kcal",
+        "whoper with chese",
+        "chicken with more than 20g protein",
+        "pecans",
+    ]:
+        start = time.perf_counter()
+        rows = database.query(question)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{question!r} ({elapsed:.2f} ms)")
+        for row in rows[:3]:
+            print("   ", row.get("item"), row.get("calories"), row.get("protein_g"))
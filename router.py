@@ -0,0 +1,130 @@
+"""
+Cheap pre-classification ahead of the three-agent crew.
+
+    greeting     - canned reply, no model calls
+    out_of_scope - canned reply when the knowledge base has nothing close
+    kb_direct    - one LLM call over the retrieved chunks when the top hit
+                   is confident enough
+    crew         - everything else goes to ResearchCrew
+
+Every decision is logged with its latency so the thresholds can be tuned.
+"""
+import os
+import re
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+GREETING = "greeting"
+OUT_OF_SCOPE = "out_of_scope"
+KB_DIRECT = "kb_direct"
+CREW = "crew"
+
+DIRECT_SCORE = float(os.getenv("ROUTER_DIRECT_SCORE", "0.75"))
+OUT_OF_SCOPE_SCORE = float(os.getenv("ROUTER_OUT_OF_SCOPE_SCORE", "0.2"))
+
+GREETING_REPLY = (
+    "Hello! I'm the J Ventures business consultant. "
+    "Ask me anything about our products, services or your business idea."
+)
+# Every "nothing found" answer uses this text, so main.py can tell them apart
+NOT_FOUND_REPLY = "Sorry, I cannot find any relevant information on this topic."
+OUT_OF_SCOPE_REPLY = NOT_FOUND_REPLY
+
+_GREETING_PATTERN = re.compile(
+    r"^\s*(hi+|hello+|hey+|yo|good (morning|afternoon|evening)|thanks?( you)?|thank u|"
+    r"สวัสดี\S*|หวัดดี\S*|ดีจ้า|ดีครับ|ดีค่ะ|ขอบคุณ\S*)\s*[!.?~]*\s*$",
+    re.IGNORECASE,
+)
+
+
+class Route:
+    __slots__ = ("name", "answer", "score", "chunks")
+
+    def __init__(self, name, answer=None, score=None, chunks=None):
+        self.name = name
+        self.answer = answer
+        self.score = score
+        # Retrieved for KB_DIRECT, to be answered with answer_direct()
+        self.chunks = chunks
+
+
+class Router:
+    """
+    Args:
+        retrieve (callable): question -> list of {"text", "score", "source"}.
+        answer (callable): (question, chunks) -> answer text in one LLM call.
+    """
+
+    def __init__(
+        self,
+        retrieve,
+        answer,
+        direct_score=DIRECT_SCORE,
+        out_of_scope_score=OUT_OF_SCOPE_SCORE,
+    ):
+        self.retrieve = retrieve
+        self.answer = answer
+        self.direct_score = direct_score
+        self.out_of_scope_score = out_of_scope_score
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._latency = {}
+
+    def greeting(self, question):
+        """The greeting route, or None; needs no retrieval or embedding."""
+        if _GREETING_PATTERN.match(question):
+            return Route(GREETING, GREETING_REPLY)
+        return None
+
+    def classify(self, question):
+        greeting = self.greeting(question)
+        if greeting is not None:
+            return greeting
+
+        chunks = self.retrieve(question)
+        top = max((c["score"] for c in chunks), default=0.0)
+        if top < self.out_of_scope_score:
+            return Route(OUT_OF_SCOPE, OUT_OF_SCOPE_REPLY, top)
+        if top >= self.direct_score:
+            return Route(KB_DIRECT, None, top, chunks)
+        return Route(CREW, None, top)
+
+    def answer_direct(self, route, question):
+        """The single LLM call for a KB_DIRECT route."""
+        return self.answer(question, route.chunks)
+
+    def route(self, question):
+        """
+        Classifies a question. Route.answer is None when an LLM has to answer:
+        KB_DIRECT routes go to answer_direct(), CREW routes to the crew.
+        """
+        try:
+            return self.classify(question)
+        except Exception as e:
+            logger.warning("Router failed, escalating to crew: %s", e)
+            return Route(CREW)
+
+    def record(self, route, question, elapsed):
+        """Logs a routing decision with the end-to-end latency of its answer."""
+        with self._lock:
+            self._counts[route.name] = self._counts.get(route.name, 0) + 1
+            self._latency[route.name] = self._latency.get(route.name, 0.0) + elapsed
+        logger.info(
+            "route=%s score=%s latency_ms=%.1f question=%r",
+            route.name,
+            "-" if route.score is None else f"{route.score:.3f}",
+            elapsed * 1000,
+            question[:80],
+        )
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: {
+                    "count": count,
+                    "avg_latency_ms": round(self._latency[name] / count * 1000, 2),
+                }
+                for name, count in self._counts.items()
+            }
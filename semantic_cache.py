@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+"""
+Semantic answer cache in front of ResearchCrew.run.
+
+Questions are embedded and compared by cosine similarity against the
+questions that were already answered. A close enough match returns the
+stored final answer without building a crew.
+"""
+import os
+import re
+import time
+import hashlib
+import threading
+import numpy as np
+
+SIMILARITY_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "2048"))
+CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+
+
+def normalize_question(text: str) -> str:
+    """Lower-cases and collapses whitespace/punctuation in a question."""
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class HashingEmbedder:
+    """
+    Deterministic local embedder based on hashed word and character n-grams.
+
+    Needs no network or model download, so it is used for offline tests and
+    as a fallback when Bedrock embeddings are not available.
+    """
+
+    def __init__(self, dimension=1024):
+        self.dimension = dimension
+
+    def _features(self, text):
+        words = normalize_question(text).split()
+        for word in words:
+            yield "w:" + word
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                yield "c:" + padded[i : i + 3]
+        for a, b in zip(words, words[1:]):
+            yield f"b:{a} {b}"
+
+    def __call__(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            h = int.from_bytes(digest, "little")
+            vector[h % self.dimension] += 1.0 if (h >> 63) & 1 else -1.0
+        return vector
+
+
+class BedrockEmbedder:
+    """Adapts a langchain BedrockEmbeddings (built lazily) to the embedder interface."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._embeddings = None
+
+    def __call__(self, text: str) -> np.ndarray:
+        if self._embeddings is None:
+            self._embeddings = self._factory()
+        return np.asarray(self._embeddings.embed_query(text), dtype=np.float32)
+
+
+class VectorStore:
+    """
+    Fixed-capacity store of unit vectors in one preallocated float32 matrix.
+
+    Each slot keeps a value, its insertion time and its last access time.
+    When full, expired slots are reused first, then the least recently used.
+    """
+
+    def __init__(self, dimension, capacity=CACHE_SIZE, ttl=CACHE_TTL):
+        self.dimension = dimension
+        self.capacity = capacity
+        self.ttl = ttl
+        self.vectors = np.zeros((capacity, dimension), dtype=np.float32)
+        self.created = np.zeros(capacity, dtype=np.float64)
+        self.accessed = np.zeros(capacity, dtype=np.float64)
+        self.values = [None] * capacity
+        self.size = 0
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def search(self, vector, now=None):
+        """Returns (slot, similarity) of the best live match, or (None, 0.0)."""
+        if self.size == 0:
+            return None, 0.0
+        now = time.time() if now is None else now
+        sims = self.vectors[: self.size] @ self._unit(vector)
+        sims[now - self.created[: self.size] > self.ttl] = -np.inf
+        slot = int(np.argmax(sims))
+        if not np.isfinite(sims[slot]):
+            return None, 0.0
+        return slot, float(sims[slot])
+
+    def touch(self, slot, now=None):
+        """Marks a slot as used, so that it is evicted last."""
+        self.accessed[slot] = time.time() if now is None else now
+
+    def add(self, vector, value, now=None):
+        now = time.time() if now is None else now
+        if self.size < self.capacity:
+            slot = self.size
+            self.size += 1
+        else:
+            expired = np.flatnonzero(now - self.created > self.ttl)
+            slot = int(expired[0]) if len(expired) else int(np.argmin(self.accessed))
+        self.vectors[slot] = self._unit(vector)
+        self.created[slot] = now
+        self.accessed[slot] = now
+        self.values[slot] = value
+        return slot
+
+
+class SemanticCache:
+    """
+    Caches final answers keyed on the question embedding.
+
+    Args:
+        embedder (callable): Maps text to a 1-D vector.
+        threshold (float): Minimum cosine similarity for a hit.
+        capacity (int): Maximum number of cached answers.
+        ttl (float): Seconds before an answer expires.
+    """
+
+    def __init__(
+        self,
+        embedder,
+        threshold=SIMILARITY_THRESHOLD,
+        capacity=CACHE_SIZE,
+        ttl=CACHE_TTL,
+    ):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        self._store = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+
+    def _embed(self, question):
+        return self.embedder(normalize_question(question))
+
+    def get(self, question):
+        """
+        Returns (answer, embedding). answer is None on a miss; pass the
+        embedding back to put() to avoid embedding the question twice.
+        """
+        vector = self._embed(question)
+        with self._lock:
+            if self._store is not None:
+                slot, similarity = self._store.search(vector)
+                if slot is not None and similarity >= self.threshold:
+                    # Near misses must not keep an entry from being evicted
+                    self._store.touch(slot)
+                    answer, duration = self._store.values[slot]
+                    self.hits += 1
+                    self.latency_saved += duration
+                    return answer, vector
+            self.misses += 1
+        return None, vector
+
+    def put(self, question, answer, duration=0.0, vector=None):
+        """Stores an answer and the time (seconds) it took to produce."""
+        if vector is None:
+            vector = self._embed(question)
+        with self._lock:
+            if self._store is None:
+                self._store = VectorStore(len(vector), self.capacity, self.ttl)
+            self._store.add(vector, (answer, duration))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": self._store.size if self._store is not None else 0,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "latency_saved_seconds": round(self.latency_saved, 3),
+            }
+
+
+if __name__ == "__main__":
+    cache = SemanticCache(HashingEmbedder(), threshold=0.8)
+    cache.put("What is a Double Whopper?", "A burger with two patties.", duration=12.0)
+    for q in ["what is a double whopper", "What is a double Whopper??", "SWOT analysis"]:
+        answer, _ = cache.get(q)
+        print(f"{q!r} -> {answer!r}")
+    print(cache.stats())
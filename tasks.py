@@ -1,38 +1,37 @@
 from crewai import Task
+from router import NOT_FOUND_REPLY
 
 
 class ResearchCrewTasks:
+    # The question appears once per task; the writer and the grader see the
+    # earlier task outputs through `context`, which crewai appends itself.
+    # Tasks run in the kickoff thread so the tools see the request deadline.
 
     def research_task(self, agent, inputs):
         return Task(
             description=(
-                f"Based on the {inputs['question']} question, extract information for the question {inputs['question']} "
-                "with the help of the tools. Use the Search tool to retrieve information."
-                "Verify the accuracy of the information and provide a clear, concise answer."
+                f"Question: {inputs['question']}\n"
+                "Retrieve information about the question with the tools and verify it. "
+                "Use the Menu and nutrition lookup tool for menu items and nutrition numbers."
             ),
             expected_output=(
-                f"A clear, concise, and factually accurate answer to the user's question {inputs['question']},"
-                "based on the information retrieved from the tool use. Don't make up an answer."
-                f"If the {inputs['question']} question not related information retrieved from the tool just say 'The answer can be incorrect or not related to the question', but don't be too strict, if it not 100% related, 80% is acceptable."
+                "A clear, concise and factually accurate answer of at most 6 sentences, based only on the retrieved "
+                "information. Don't make up an answer. If the retrieved information is not related to the question, "
+                "say 'The answer can be incorrect or not related to the question' (80% related is acceptable)."
             ),
             agent=agent,
-            async_execution=True,
         )
 
     def writing_task(self, agent, context, inputs):
         return Task(
             description=(
-                "Use the verified research information provided by the Research Agent."
-                "Your task is to create a well-structured and engaging piece of content."
-                "Focus on clarity, readability, and flow. The content should be suitable for"
-                "the intended audience and the topic should be covered comprehensively."
-                "Ensure that the final content is formatted and ready for publication and use all the key points to write the answer."
+                f"Question: {inputs['question']}\n"
+                "Write the answer from the verified research, using all its key points. "
+                "Describe how to do it, step by step, in a friendly and engaging tone. Don't imply."
             ),
             expected_output=(
-                "A complete and engaging piece of content, maximum 4 sentences."
-                "that is well-structured, easy to read, and aligns with the information provided. The answer you write need to describe How to (each step process) of the method and solution appraoch. Don't imply. Write the answer in a friendly and engaging tone."
-                f"If the {inputs['question']} question not related information retrieved from the research agents just say 'Unfortunately, I could not find any relevant information on this topic'."
-                f"The answer need to use the context {context} and write the best friendly answer related to the question {inputs['question']}"
+                "A well-structured, easy to read answer of at most 4 sentences. If the research has no related "
+                f"information, say '{NOT_FOUND_REPLY}'"
             ),
             agent=agent,
             context=context,
@@ -42,13 +41,13 @@ class ResearchCrewTasks:
     def hallucination_task(self, agent, context, inputs):
         return Task(
             description=(
-                f"Based on the response from the grader task for the quetion {inputs['question']} evaluate whether the answer is grounded in / supported by a set of facts."
+                f"Question: {inputs['question']}\n"
+                "Evaluate whether the written answer is grounded in / supported by the research facts."
             ),
             expected_output=(
-                "if the answer is in useful and contains fact about the question asked just give the answer of content writing task."
-                "If the answer is not useful or does not contain facts about the question asked, respond 'Sorry, I cannot find any relevant information on this topic.'"
+                "The written answer unchanged if it is useful and contains facts about the question. "
+                f"Otherwise '{NOT_FOUND_REPLY}'"
             ),
             agent=agent,
             context=context,
-            async_execution=True,
         )
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Metrics stay in memory unless a test points TRACE_DB at a file
+os.environ.setdefault("TRACE_DB", "")
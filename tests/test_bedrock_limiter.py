@@ -0,0 +1,116 @@
+import os
+import types
+import pytest
+import bedrock_limiter
+from bedrock_limiter import BedrockLimiter, RATE_INCREASE, RATE_DECREASE, GLOBAL_KEY
+
+MODEL = "meta.llama3-70b-instruct-v1:0"
+
+
+def limiter_at(path, **limit):
+    return BedrockLimiter(str(path), limits={MODEL: dict({"rate": 5.0, "burst": 5.0}, **limit)})
+
+
+def in_children(count, fn):
+    """Runs fn() in `count` forked processes; returns their exit codes."""
+    children = []
+    for _ in range(count):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os._exit(fn())
+            except BaseException:
+                os._exit(255)
+        children.append(pid)
+    return [os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]) for pid in children]
+
+
+def test_processes_share_one_bucket(tmp_path):
+    path = tmp_path / "limiter.db"
+    limiter_at(path, rate=0.01)
+
+    def take_all():
+        limiter = limiter_at(path, rate=0.01)
+        return sum(limiter.try_acquire(MODEL) == 0.0 for _ in range(5))
+
+    # Five tokens between three processes, not five each
+    assert sum(in_children(3, take_all)) == 5
+
+
+def test_rate_adapts_to_feedback_from_every_process(tmp_path):
+    path = tmp_path / "limiter.db"
+    limiter = limiter_at(path)
+
+    def succeed():
+        other = limiter_at(path)
+        for _ in range(10):
+            other.record_success(MODEL)
+        return 0
+
+    assert in_children(4, succeed) == [0, 0, 0, 0]
+    assert limiter.stats()[MODEL]["rate"] == pytest.approx(5.0 + 40 * RATE_INCREASE)
+
+    assert in_children(1, lambda: limiter_at(path).record_throttle(MODEL) and 0) == [0]
+    assert limiter.stats()[MODEL]["rate"] == pytest.approx((5.0 + 40 * RATE_INCREASE) * RATE_DECREASE)
+
+
+def test_rate_stays_within_bounds(tmp_path):
+    limiter = limiter_at(tmp_path / "limiter.db", min_rate=1.0, max_rate=6.0)
+    for _ in range(20):
+        limiter.record_throttle(MODEL)
+    assert limiter.stats()[MODEL]["rate"] == 1.0
+    for _ in range(100):
+        limiter.record_success(MODEL)
+    assert limiter.stats()[MODEL]["rate"] == 6.0
+
+
+class CountingLimiter(BedrockLimiter):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.acquired = []
+
+    def acquire(self, key, level=None, timeout=None):
+        self.acquired.append(key)
+        return super().acquire(key, level, timeout)
+
+
+def test_litellm_calls_take_limiter_tokens(tmp_path, monkeypatch):
+    limiter = CountingLimiter(str(tmp_path / "limiter.db"), limits={MODEL: {"rate": 0.01, "burst": 3.0}})
+    monkeypatch.setattr(bedrock_limiter, "_limiter", limiter)
+
+    for _ in range(3):
+        bedrock_limiter._litellm_pre_call({"model": f"bedrock/{MODEL}"})
+    bedrock_limiter._litellm_pre_call({"model": "gpt-4o-mini", "custom_llm_provider": "openai"})
+
+    assert limiter.acquired == [MODEL] * 3
+    # The crew's calls used up the model's burst
+    assert limiter.try_acquire(MODEL) > 0.0
+    assert limiter.stats()[GLOBAL_KEY]["tokens"] < limiter.limit(GLOBAL_KEY)["burst"] - 2
+
+
+def test_litellm_throttles_lower_the_rate(tmp_path, monkeypatch):
+    limiter = limiter_at(tmp_path / "limiter.db")
+    monkeypatch.setattr(bedrock_limiter, "_limiter", limiter)
+    kwargs = {"model": f"bedrock/{MODEL}", "exception": types.SimpleNamespace(status_code=429)}
+
+    bedrock_limiter._litellm_success(dict(kwargs, exception=None), None, None, None)
+    bedrock_limiter._litellm_failure(kwargs, None, None, None)
+    assert limiter.stats()[MODEL]["rate"] == pytest.approx((5.0 + RATE_INCREASE) * RATE_DECREASE)
+
+    # Other failures leave the rate alone
+    bedrock_limiter._litellm_failure(dict(kwargs, exception=ValueError("bad request")), None, None, None)
+    assert limiter.stats()[MODEL]["rate"] == pytest.approx((5.0 + RATE_INCREASE) * RATE_DECREASE)
+
+
+def test_litellm_key():
+    assert bedrock_limiter.litellm_key({"model": f"bedrock/converse/{MODEL}"}) == MODEL
+    assert bedrock_limiter.litellm_key({"model": MODEL, "custom_llm_provider": "bedrock"}) == MODEL
+    assert bedrock_limiter.litellm_key({"model": "gpt-4o"}) is None
+
+
+def test_install_registers_the_litellm_callbacks():
+    litellm = pytest.importorskip("litellm")
+    bedrock_limiter.install_llm_callbacks()
+    bedrock_limiter.install_llm_callbacks()
+    assert litellm.input_callback.count(bedrock_limiter._litellm_pre_call) == 1
+    assert bedrock_limiter._litellm_failure in litellm.failure_callback
@@ -0,0 +1,90 @@
+import threading
+import pytest
+from caching import SingleFlight, TTLCache
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return "answer"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("q", fetch, timeout=5))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    while flight.stats()["in_flight"] == 0:
+        threading.Event().wait(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+    assert results == ["answer"] * 5
+    assert len(calls) + flight.stats()["coalesced"] == 5
+
+
+def test_follower_times_out_and_the_leader_finishes():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "late"
+
+    leader = []
+    thread = threading.Thread(target=lambda: leader.append(flight.do("q", slow)))
+    thread.start()
+    assert started.wait(5)
+    with pytest.raises(TimeoutError):
+        flight.do("q", lambda: "never", timeout=0.05)
+    assert flight.stats()["timeouts"] == 1
+
+    release.set()
+    thread.join()
+    assert leader == ["late"]
+    # The key is free again once the leader is done
+    assert flight.do("q", lambda: "fresh") == "fresh"
+
+
+def test_leader_errors_reach_the_followers():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("throttled")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("q", fail, timeout=5)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    threading.Event().wait(0.1)  # let the follower join the call
+    release.set()
+    leader.join()
+    follower.join()
+    assert errors == ["throttled", "throttled"]
+    assert flight.stats()["executions"] == 1
+
+
+def test_ttl_cache_expires_and_evicts():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert cache.get("a") is None
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,19 @@
+from conversation_store import SQLiteConversationStore
+
+
+def test_least_recently_used_conversation_is_evicted(tmp_path):
+    store = SQLiteConversationStore(str(tmp_path / "history.db"), max_messages=2, max_conversations=2)
+    store.append("U1", "user", "one")
+    store.append("U2", "user", "two")
+    store.append("U1", "user", "again")
+    store.append("U3", "user", "three")
+    assert len(store) == 2
+    assert store.history("U2") == []
+    assert [m.text for m in store.history("U1")] == ["one", "again"]
+
+
+def test_history_is_capped_per_conversation(tmp_path):
+    store = SQLiteConversationStore(str(tmp_path / "history.db"), max_messages=2, max_conversations=2)
+    for text in ("a", "b", "c"):
+        store.append("U1", "user", text)
+    assert [m.text for m in store.history("U1")] == ["b", "c"]
@@ -0,0 +1,45 @@
+import random
+from converter import BloomFilter, Deduplicator, _hash64
+
+FOOTER = " ".join(f"nav{i}" for i in range(40))
+
+
+def page(rng, words=60):
+    return " ".join(f"word{rng.randrange(5000)}" for _ in range(words))
+
+
+def test_bloom_filter_remembers_keys():
+    bloom = BloomFilter(1000, 1e-4)
+    keys = [_hash64(str(i).encode()) for i in range(1000)]
+    assert not any(bloom.add(key) for key in keys)
+    assert all(bloom.add(key) for key in keys)
+
+
+def test_exact_duplicates():
+    dedup = Deduplicator(capacity=100)
+    assert not dedup.is_duplicate("Blockchain voting systems in Thailand")
+    assert dedup.is_duplicate("Blockchain voting systems in Thailand")
+    assert dedup.exact_duplicates == 1
+
+
+def test_near_duplicates_share_boilerplate():
+    dedup = Deduplicator(capacity=100)
+    assert not dedup.is_duplicate(f"{FOOTER} item1")
+    assert dedup.is_duplicate(f"{FOOTER} item2")
+    assert dedup.near_duplicates == 1
+
+
+def test_distinct_pages_are_kept():
+    rng = random.Random(0)
+    dedup = Deduplicator(capacity=5000)
+    kept = sum(not dedup.is_duplicate(page(rng)) for _ in range(5000))
+    assert kept >= 4995
+
+
+def test_state_size_is_fixed():
+    rng = random.Random(1)
+    dedup = Deduplicator(capacity=1000)
+    size = dedup.nbytes
+    for _ in range(3000):
+        dedup.is_duplicate(page(rng))
+    assert dedup.nbytes == size
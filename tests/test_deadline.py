@@ -0,0 +1,57 @@
+import time
+import pytest
+import deadline
+import tracing
+from deadline import Deadline, DeadlineExceeded, STAGE_MIN, STAGE_TIMEOUT, REPLY_RESERVE
+
+
+def degraded_count(reason):
+    return tracing._counters.get(("bot_degraded_responses_total", (("reason", reason),)), 0)
+
+
+def test_optional_stages_need_their_minimum():
+    request = Deadline(STAGE_MIN["grader"] + 1)
+    assert request.enough("grader")
+    assert not Deadline(STAGE_MIN["grader"] - 1).enough("grader")
+
+
+def test_timeout_is_capped_by_what_is_left():
+    request = Deadline(20)
+    assert request.timeout("crew") == pytest.approx(20 - REPLY_RESERVE, abs=0.1)
+    assert Deadline(1000).timeout("crew") == STAGE_TIMEOUT["crew"]
+
+
+def test_too_little_time_gives_the_full_stage_timeout():
+    # The reply token is given up on and the answer is pushed instead
+    assert Deadline(1).timeout("crew") == STAGE_TIMEOUT["crew"]
+
+
+def test_for_event_counts_time_since_the_event():
+    event = {"timestamp": (time.time() - 30) * 1000}
+    assert Deadline.for_event(event, seconds=45).remaining() == pytest.approx(15, abs=0.5)
+    assert Deadline.for_event({"timestamp": (time.time() - 60) * 1000}, seconds=45).expired()
+
+
+def test_without_a_scope_nothing_is_skipped():
+    assert deadline.current() is None
+    assert deadline.enough("grader")
+    assert deadline.timeout("translate") == STAGE_TIMEOUT["translate"]
+    deadline.check("image")
+
+
+def test_check_raises_in_a_short_scope():
+    with deadline.scope(Deadline(1)):
+        assert not deadline.enough("image")
+        with pytest.raises(DeadlineExceeded):
+            deadline.check("image")
+    assert deadline.current() is None
+
+
+def test_degraded_is_counted_and_recorded_on_the_request():
+    before = degraded_count("grader_skipped")
+    request = Deadline(5)
+    with deadline.scope(request):
+        deadline.degraded("grader_skipped")
+    deadline.degraded("grader_skipped")
+    assert request.degradations == ["grader_skipped"]
+    assert degraded_count("grader_skipped") == before + 2
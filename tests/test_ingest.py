@@ -0,0 +1,41 @@
+import json
+from ingest import Ingestor, StubEmbeddings
+
+
+def write_data(data_dir, name, records):
+    with open(data_dir / name, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def make_ingestor(tmp_path, dimension=64):
+    return Ingestor(
+        data_dir=str(tmp_path / "data"),
+        index_dir=str(tmp_path / "index"),
+        embeddings=StubEmbeddings(dimension),
+        processes=1,
+    )
+
+
+def test_unchanged_files_are_not_reassembled(tmp_path):
+    (tmp_path / "data").mkdir()
+    write_data(tmp_path / "data", "a.jsonl", [{"prompt": "Opening hours", "completion": "9 to 5"}])
+    assert make_ingestor(tmp_path).run()["changed"] == 1
+
+    embeddings_path = tmp_path / "index" / "embeddings.npy"
+    written = embeddings_path.stat().st_mtime_ns
+    stats = make_ingestor(tmp_path).run()
+    assert stats["changed"] == 0 and stats["chunks_total"] == 1
+    assert embeddings_path.stat().st_mtime_ns == written
+
+
+def test_a_new_embedder_re_embeds_every_file(tmp_path):
+    (tmp_path / "data").mkdir()
+    write_data(tmp_path / "data", "a.jsonl", [{"prompt": "Opening hours", "completion": "9 to 5"}])
+    write_data(tmp_path / "data", "b.jsonl", [{"prompt": "Parking", "completion": "Free after 6"}])
+    make_ingestor(tmp_path, dimension=64).run()
+
+    stats = make_ingestor(tmp_path, dimension=32).run()
+    assert stats["changed"] == 2
+    manifest = json.loads((tmp_path / "index" / "manifest.json").read_text())
+    assert manifest["embedder"]["dimension"] == 32
@@ -0,0 +1,42 @@
+import numpy as np
+from local_index import LocalIndex
+from router import OUT_OF_SCOPE_SCORE
+from semantic_cache import HashingEmbedder
+
+DOCUMENTS = [
+    "Double Whopper: two flame grilled beef patties, tomatoes, lettuce, mayonnaise, ketchup, pickles and onions on a sesame seed bun.",
+    "Chicken sandwich nutrition: 660 calories, 28 grams of protein, 40 grams of fat.",
+    "A SWOT analysis lists the strengths, weaknesses, opportunities and threats of a business.",
+    "Blockchain voting systems record every ballot on a distributed ledger so results can be audited.",
+    "J Ventures offers consulting services for startups, from business plans to product launches.",
+    "The key challenges of NFTs are ownership disputes, market volatility and copyright.",
+]
+
+
+def build_index():
+    embedder = HashingEmbedder()
+    chunks = [{"text": text, "source": f"doc#{i}"} for i, text in enumerate(DOCUMENTS)]
+    embeddings = np.stack([embedder(text) for text in DOCUMENTS]).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return LocalIndex(chunks, embeddings, embedder)
+
+
+def test_off_topic_queries_score_below_the_out_of_scope_threshold():
+    index = build_index()
+    for query in ["weather tomorrow in Paris", "football world cup results", "bake a chocolate cake on mars"]:
+        assert index.search(query)[0]["score"] < OUT_OF_SCOPE_SCORE, query
+
+
+def test_on_topic_queries_score_above_the_out_of_scope_threshold():
+    index = build_index()
+    for query, source in [("What is a Double Whopper?", "doc#0"), ("SWOT analysis", "doc#2"), ("blockchain voting", "doc#3")]:
+        top = index.search(query)[0]
+        assert top["source"] == source
+        assert top["score"] > OUT_OF_SCOPE_SCORE, query
+
+
+def test_lexical_scores_are_bounded_and_ignore_stopwords():
+    index = build_index()
+    scores = index.lexical_scores("SWOT analysis")
+    assert 0.0 <= scores.min() and scores.max() < 1.0
+    assert np.array_equal(index.lexical_scores("what is the SWOT analysis"), scores)
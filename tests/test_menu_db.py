@@ -0,0 +1,52 @@
+import pytest
+from menu_db import MenuDatabase
+
+pytest.importorskip("pandas")
+
+MENU = """Item,Category,Calories,Protein (g)
+Whopper® Sandwich,Burgers,660,28
+Whopper® Sandwich with Cheese,Burgers,740,32
+Whopper® Sandwich with Cheese,Burgers,740,32
+Hamburger,Burgers,250,13
+Original Chicken Sandwich,Chicken,630,24
+Chicken Nuggets- 4pc,Chicken,170,8
+Ranch Dipping Sauce (1 oz),Chicken,140,0
+Lard,Breakfast,115,0
+"""
+
+
+@pytest.fixture
+def database(tmp_path):
+    menu = tmp_path / "menu.csv"
+    menu.write_text(MENU, encoding="utf-8")
+    return MenuDatabase(str(tmp_path / "menu.db"), str(menu), str(tmp_path / "missing.xlsx"))
+
+
+def test_lookup_returns_each_item_once(database):
+    rows = database.lookup("Whopper with cheese")
+    assert [row["item"] for row in rows] == ["Whopper® Sandwich with Cheese"]
+
+
+def test_lookup_corrects_typos_word_by_word(database):
+    assert database.lookup("whoper with chese")[0]["item"] == "Whopper® Sandwich with Cheese"
+    assert database.lookup("chiken nugets")[0]["item"] == "Chicken Nuggets- 4pc"
+
+
+def test_lookup_of_an_unknown_item_is_empty(database):
+    assert database.lookup("salads") == []
+
+
+def test_filter_returns_each_item_once(database):
+    rows = database.filter("calories", minimum=700)
+    assert [row["item"] for row in rows] == ["Whopper® Sandwich with Cheese"]
+
+
+def test_query_filters_by_category(database):
+    rows = database.query("burgers under 700 kcal")
+    assert [row["item"] for row in rows] == ["Whopper® Sandwich", "Hamburger"]
+    assert [row["item"] for row in database.query("burgrs under 300 calories")] == ["Hamburger"]
+
+
+def test_query_for_a_category_the_menu_lacks_is_empty(database):
+    assert database.query("drinks under 200 calories") == []
+    assert len(database.query("under 200 calories")) == 3
@@ -0,0 +1,23 @@
+import os
+import tracing
+
+
+def test_render_sums_metrics_over_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_DB", str(tmp_path / "metrics.db"))
+    tracing.increment("bot_llm_calls_total", model="parent")
+
+    children = []
+    for _ in range(3):
+        pid = os.fork()
+        if pid == 0:
+            tracing.increment("bot_llm_calls_total", 2, model="parent")
+            tracing.observe("bot_stage_seconds", 0.3, stage="child")
+            tracing.flush()
+            os._exit(0)
+        children.append(pid)
+    for pid in children:
+        assert os.waitpid(pid, 0)[1] == 0
+
+    text = tracing.render()
+    assert 'bot_llm_calls_total{model="parent"} 7' in text
+    assert 'bot_stage_seconds_count{stage="child"} 3' in text
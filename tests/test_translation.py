@@ -0,0 +1,26 @@
+from translation import TranslationService, DictionaryBackend, split_text
+
+
+def test_short_text_is_one_unchanged_chunk():
+    text = "Our menu:\n- Whopper\n- Fries"
+    assert split_text(text, 100) == [(text, "")]
+
+
+def test_chunks_keep_the_original_separators():
+    text = "First line.\nSecond line!\n\nThird paragraph, which is longer. " + "word " * 20 + "end."
+    chunks = split_text(text, 40)
+    assert all(len(chunk) <= 40 for chunk, _ in chunks)
+    assert "".join(chunk + space for chunk, space in chunks) == text
+    assert "\n\n" in [space for _, space in chunks]
+
+
+def test_translated_chunks_are_rejoined_with_their_separators():
+    backend = DictionaryBackend({
+        ("Hello there.", "th"): "สวัสดี",
+        ("See you soon.", "th"): "แล้วพบกันใหม่",
+        ("Bye now.", "th"): "ลาก่อน",
+    })
+    service = TranslationService(backend)
+    service.max_chunk_chars = 20
+    translated = service.translate_batch(["Hello there.\nSee you soon.\n\nBye now."], "th")[0]
+    assert translated == "สวัสดี\nแล้วพบกันใหม่\n\nลาก่อน"
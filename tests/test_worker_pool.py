@@ -0,0 +1,109 @@
+import threading
+import pytest
+from worker_pool import WorkerPool, QueueFullError, REJECT, DROP_OLDEST, BUSY
+
+
+def blocked_pool(policy, max_queue=2):
+    """A one-thread pool whose thread is stuck on a job until the event is set."""
+    pool = WorkerPool(workers=1, max_queue=max_queue, policy=policy)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    pool.submit(block)
+    assert started.wait(5)
+    return pool, release
+
+
+def wait_idle(pool):
+    for _ in range(500):
+        stats = pool.stats()
+        if stats["queue_depth"] == 0 and stats["in_flight"] == 0:
+            return stats
+        threading.Event().wait(0.01)
+    raise AssertionError(f"pool did not drain: {pool.stats()}")
+
+
+def test_runs_jobs():
+    pool = WorkerPool(workers=2, max_queue=10)
+    done = []
+    for i in range(5):
+        assert pool.submit(done.append, i)
+    assert wait_idle(pool)["completed"] == 5
+    assert sorted(done) == list(range(5))
+
+
+def test_reject_raises_when_full():
+    pool, release = blocked_pool(REJECT)
+    pool.submit(lambda: None)
+    pool.submit(lambda: None)
+    with pytest.raises(QueueFullError):
+        pool.submit(lambda: None)
+    release.set()
+    assert wait_idle(pool)["rejected"] == 1
+
+
+def test_drop_oldest_discards_the_oldest_waiting_job():
+    pool, release = blocked_pool(DROP_OLDEST)
+    ran, dropped = [], []
+    for i in range(3):
+        pool.submit(ran.append, i, on_drop=lambda i=i: dropped.append(i))
+    release.set()
+    stats = wait_idle(pool)
+    assert dropped == [0]
+    assert ran == [1, 2]
+    assert stats["dropped"] == 1
+
+
+def test_busy_calls_on_drop_of_the_new_job():
+    pool, release = blocked_pool(BUSY)
+    ran, busy = [], []
+    for i in range(3):
+        queued = pool.submit(ran.append, i, on_drop=lambda i=i: busy.append(i))
+        assert queued == (i < 2)
+    release.set()
+    wait_idle(pool)
+    assert busy == [2]
+    assert ran == [0, 1]
+
+
+def test_on_drop_errors_do_not_reach_the_caller():
+    pool, release = blocked_pool(BUSY, max_queue=1)
+
+    def fail():
+        raise RuntimeError("LINE is down")
+
+    pool.submit(lambda: None)
+    assert pool.submit(lambda: None, on_drop=fail) is False
+    release.set()
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        WorkerPool(policy="block")
+
+
+def test_start_runs_the_initializer_in_every_thread():
+    initialized = set()
+    ran_on = []
+    pool = WorkerPool(workers=3, initializer=lambda: initialized.add(threading.get_ident()))
+    assert pool.start(timeout=5)
+    assert len(initialized) == 3
+    pool.submit(lambda: ran_on.append(threading.get_ident()))
+    wait_idle(pool)
+    assert ran_on[0] in initialized
+
+
+def test_failing_initializer_does_not_stop_the_pool():
+    def fail():
+        raise RuntimeError("no credentials")
+
+    pool = WorkerPool(workers=2, initializer=fail)
+    assert pool.start(timeout=5)
+    done = []
+    pool.submit(done.append, 1)
+    wait_idle(pool)
+    assert done == [1]
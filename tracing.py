@@ -0,0 +1,271 @@
+"""
+Per-stage timing spans and Prometheus metrics for the bot pipeline.
+
+    with span("titan_image"):
+        ...
+
+records the duration into the bot_stage_seconds histogram under a "stage"
+label. render() returns every metric in the Prometheus text format for the
+/metrics route.
+
+Each process records in memory and a background thread writes its totals
+to one SQLite file (TRACE_DB) every TRACE_FLUSH_INTERVAL seconds, so
+render() in any gunicorn worker reports the sum over all workers, past
+ones included. With TRACE_DB empty, metrics are per worker process.
+
+TRACE_SAMPLE_RATE (0..1) samples spans to keep overhead low on hot paths;
+counters such as token counts are always recorded.
+"""
+import os
+import json
+import time
+import uuid
+import random
+import bisect
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+# Log every span as a structured record at DEBUG level
+LOG_SPANS = os.getenv("TRACE_LOG_SPANS", "false").lower() == "true"
+TRACE_DB = os.getenv("TRACE_DB", "metrics.db")
+FLUSH_INTERVAL = float(os.getenv("TRACE_FLUSH_INTERVAL", "5"))
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+# (name, labels tuple) -> [bucket counts..., overflow, sum, count]
+_histograms = {}
+_counters = {}
+# Series changed since the last flush
+_dirty = set()
+_local = threading.local()
+_process = None
+_flusher_pid = None
+_help = {
+    "bot_stage_seconds": ("histogram", "Duration of each pipeline stage in seconds."),
+    "bot_llm_tokens_total": ("counter", "LLM tokens by model and kind (prompt/completion)."),
+    "bot_llm_calls_total": ("counter", "LLM calls by model."),
+    "bot_task_tokens_total": ("counter", "Crew LLM tokens by task (agent role) and kind."),
+    "bot_stage_errors_total": ("counter", "Pipeline stages that raised, by stage."),
+    "bot_grounding_total": ("counter", "Local groundedness verdicts of crew answers (pass/fail/borderline)."),
+    "bot_degraded_responses_total": ("counter", "Responses that skipped or cut short a stage to meet the reply deadline, by reason."),
+}
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _after_fork():
+    # A forked worker starts from zero under its own ID; the parent's
+    # metrics are already in the database under the parent's
+    global _lock, _process, _flusher_pid
+    _lock = threading.Lock()
+    _histograms.clear()
+    _counters.clear()
+    _dirty.clear()
+    _process = None
+    _flusher_pid = None
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _connect():
+    # sqlite3 connections must not cross threads or fork()
+    pid = os.getpid()
+    db = getattr(_local, "db", None)
+    if db is None or _local.pid != pid:
+        db = sqlite3.connect(TRACE_DB, timeout=10, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS metrics (process TEXT, name TEXT, labels TEXT, "
+            "kind TEXT, value TEXT, PRIMARY KEY (process, name, labels))"
+        )
+        _local.db = db
+        _local.pid = pid
+    return db
+
+
+def flush():
+    """Writes this process's changed series to TRACE_DB."""
+    global _process
+    if not TRACE_DB:
+        return
+    with _lock:
+        if _process is None:
+            # PIDs are reused, so each process gets a unique ID
+            _process = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        keys = set(_dirty)
+        _dirty.clear()
+        rows = []
+        for key in keys:
+            name, labels = key
+            if key in _histograms:
+                rows.append((_process, name, json.dumps(labels), "histogram", json.dumps(_histograms[key])))
+            else:
+                rows.append((_process, name, json.dumps(labels), "counter", json.dumps(_counters[key])))
+    if not rows:
+        return
+    db = _connect()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        db.executemany("INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?, ?)", rows)
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        with _lock:
+            _dirty.update(keys)
+        raise
+
+
+def _flush_forever():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            logger.warning("Could not write metrics to %s: %s", TRACE_DB, e)
+
+
+def _ensure_flusher():
+    # Called with _lock held; threads do not survive fork(), so one per process
+    global _flusher_pid
+    if not TRACE_DB or _flusher_pid == os.getpid():
+        return
+    _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_forever, name="metrics-flush", daemon=True).start()
+
+
+def observe(name, value, **labels):
+    """Adds one observation to a histogram."""
+    key = (name, _labels(labels))
+    with _lock:
+        series = _histograms.get(key)
+        if series is None:
+            series = _histograms[key] = [0] * (len(BUCKETS) + 3)
+        series[bisect.bisect_left(BUCKETS, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+        _dirty.add(key)
+        _ensure_flusher()
+
+
+def increment(name, amount=1, **labels):
+    """Adds to a counter."""
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+        _dirty.add(key)
+        _ensure_flusher()
+
+
+@contextmanager
+def span(stage, **attributes):
+    """Times a block as one pipeline stage (subject to TRACE_SAMPLE_RATE)."""
+    if SAMPLE_RATE < 1.0 and random.random() >= SAMPLE_RATE:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        increment("bot_stage_errors_total", stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        observe("bot_stage_seconds", elapsed, stage=stage)
+        if LOG_SPANS:
+            logger.debug("span", extra={"stage": stage, "seconds": elapsed, **attributes})
+
+
+def record_tokens(model, prompt_tokens, completion_tokens):
+    """Counts the tokens of one LLM call."""
+    increment("bot_llm_calls_total", model=model)
+    increment("bot_llm_tokens_total", prompt_tokens or 0, model=model, kind="prompt")
+    increment("bot_llm_tokens_total", completion_tokens or 0, model=model, kind="completion")
+
+
+def _litellm_success(kwargs, response, start_time, end_time):
+    model = kwargs.get("model", "unknown")
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        record_tokens(model, usage.prompt_tokens, usage.completion_tokens)
+    observe("bot_stage_seconds", (end_time - start_time).total_seconds(), stage="llm_call")
+
+
+def install_llm_callbacks():
+    """Times and counts tokens of every crew LLM call (crewai calls go through litellm)."""
+    try:
+        import litellm
+    except ImportError:
+        return
+    if _litellm_success not in litellm.success_callback:
+        litellm.success_callback.append(_litellm_success)
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def _collect():
+    """(histograms, counters) summed over every process in TRACE_DB."""
+    flush()
+    histograms, counters = {}, {}
+    for name, labels, kind, value in _connect().execute("SELECT name, labels, kind, value FROM metrics"):
+        key = (name, tuple(map(tuple, json.loads(labels))))
+        value = json.loads(value)
+        if kind == "histogram":
+            total = histograms.setdefault(key, [0] * len(value))
+            for i, v in enumerate(value):
+                total[i] += v
+        else:
+            counters[key] = counters.get(key, 0) + value
+    return histograms, counters
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    if TRACE_DB:
+        histograms, counters = _collect()
+    else:
+        with _lock:
+            histograms = {k: list(v) for k, v in _histograms.items()}
+            counters = dict(_counters)
+
+    lines = []
+    described = set()
+
+    def describe(name):
+        if name in described:
+            return
+        described.add(name)
+        kind, text = _help.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), series in sorted(histograms.items()):
+        describe(name)
+        cumulative = 0
+        for bound, count in zip(BUCKETS, series):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        cumulative += series[len(BUCKETS)]
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {series[-2]}")
+        lines.append(f"{name}_count{_format_labels(labels)} {series[-1]}")
+
+    for (name, labels), value in sorted(counters.items()):
+        describe(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
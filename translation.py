@@ -0,0 +1,225 @@
+"""
+Language detection and cached translation for LINE messages.
+
+The bot only needs to tell Thai from English, which the Unicode script of
+the text answers deterministically and in microseconds, so langdetect is
+not used on the request path. Translations are cached by a hash of the
+text, and long answers are split into chunks that are translated
+concurrently.
+"""
+import os
+import re
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from caching import TTLCache
+from deadline import degraded
+
+logger = logging.getLogger(__name__)
+
+THAI_RANGE = re.compile(r"[฀-๿]")
+LATIN_RANGE = re.compile(r"[A-Za-z]")
+# Captures the whitespace between sentences so it can be put back
+SENTENCE_END = re.compile(r"((?<=[.!?\n])\s+)")
+
+# Google Translate rejects requests over 5000 characters
+MAX_CHUNK_CHARS = int(os.getenv("TRANSLATION_MAX_CHUNK_CHARS", "1500"))
+
+# Backend calls that may still be running after their timeout. deep_translator
+# has no request timeout, so such calls keep their thread until Google answers;
+# the pool has this many threads on top of `workers` for them.
+MAX_ABANDONED = int(os.getenv("TRANSLATION_MAX_ABANDONED", "8"))
+
+
+def detect_language(text: str) -> str:
+    """Returns "th" if the text is mostly Thai script, otherwise "en"."""
+    thai = len(THAI_RANGE.findall(text))
+    latin = len(LATIN_RANGE.findall(text))
+    return "th" if thai and thai >= latin * 0.3 else "en"
+
+
+def split_text(text: str, max_chars=MAX_CHUNK_CHARS):
+    """
+    Splits text into chunks of at most max_chars, on sentence boundaries
+    where possible. Returns (chunk, separator) pairs, separator being the
+    whitespace that followed the chunk in text, so newlines survive the
+    round trip: "".join(chunk + separator for ...) == text.
+    """
+    if len(text) <= max_chars:
+        return [(text, "")]
+    pieces = SENTENCE_END.split(text)
+    chunks = []
+    current, pending = "", ""
+    for sentence, separator in zip(pieces[::2], pieces[1::2] + [""]):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 and sentence[:cut].strip() else max_chars
+            if current:
+                chunks.append((current, pending))
+                current = ""
+            rest = sentence[cut:].lstrip()
+            chunks.append((sentence[:cut], sentence[cut : len(sentence) - len(rest)]))
+            sentence = rest
+        if not sentence and not current:
+            chunk, space = chunks[-1]
+            chunks[-1] = (chunk, space + separator)
+            continue
+        if current and len(current) + len(pending) + len(sentence) > max_chars:
+            chunks.append((current, pending))
+            current = sentence
+        else:
+            current = current + pending + sentence if current else sentence
+        pending = separator
+    if current:
+        chunks.append((current, pending))
+    return chunks
+
+
+class GoogleBackend:
+    """Translates through deep_translator's GoogleTranslator."""
+
+    def translate(self, text, target):
+        from deep_translator import GoogleTranslator
+
+        return GoogleTranslator(source="auto", target=target).translate(text)
+
+
+class DictionaryBackend:
+    """Offline stand-in that looks translations up in a dict (or echoes the text)."""
+
+    def __init__(self, mapping=None):
+        self.mapping = mapping or {}
+        self.calls = 0
+
+    def translate(self, text, target):
+        self.calls += 1
+        return self.mapping.get((text, target), text)
+
+
+class TranslationService:
+    """
+    Args:
+        backend: Object with translate(text, target) -> str.
+        cache_size (int): Number of translated chunks to keep.
+        workers (int): Concurrent backend calls for long texts and batches.
+        max_abandoned (int): Timed-out calls allowed to keep running. Once
+            this many are stuck, timed translations are skipped until one
+            of them returns, instead of queueing behind them.
+    """
+
+    def __init__(self, backend=None, cache_size=4096, ttl=86400.0, workers=4, max_abandoned=MAX_ABANDONED):
+        self.backend = backend or GoogleBackend()
+        self.cache = TTLCache(maxsize=cache_size, ttl=ttl)
+        self.max_chunk_chars = MAX_CHUNK_CHARS
+        self.max_abandoned = max_abandoned
+        self._abandoned = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers + max_abandoned, thread_name_prefix="translate"
+        )
+
+    @staticmethod
+    def _key(text, target):
+        return hashlib.sha1(f"{target}\0{text}".encode("utf-8")).hexdigest()
+
+    def _translate_chunk(self, text, target, retries=0):
+        if not text.strip():
+            return text
+        key = self._key(text, target)
+        translated = self.cache.get(key)
+        if translated is None:
+            for attempt in range(retries + 1):
+                try:
+                    translated = self.backend.translate(text, target)
+                    break
+                except Exception:
+                    if attempt == retries:
+                        raise
+            self.cache.set(key, translated)
+        return translated
+
+    def translate(self, text: str, target: str, timeout=None, retries=0) -> str:
+        """Translates text, splitting long text into concurrently translated chunks."""
+        return self.translate_batch([text], target, timeout, retries)[0]
+
+    def _release(self, future):
+        with self._lock:
+            self._abandoned -= 1
+
+    def _translate_within(self, chunks, target, timeout, retries):
+        """Translates chunks in the pool; chunks that fail or miss the timeout stay untranslated."""
+        with self._lock:
+            stuck = self._abandoned >= self.max_abandoned
+        if stuck:
+            logger.warning("%d translation calls are still stuck; sending the text untranslated", self.max_abandoned)
+            degraded("translation_skipped")
+            return list(chunks)
+
+        futures = [
+            self._executor.submit(self._translate_chunk, chunk, target, retries)
+            for chunk in chunks
+        ]
+        wait(futures, timeout)
+        results = []
+        missed = 0
+        for chunk, future in zip(chunks, futures):
+            if future.done() and future.exception() is None:
+                results.append(future.result())
+            else:
+                # A call already running cannot be cancelled; count its thread
+                # as taken until it returns
+                if not future.done() and not future.cancel():
+                    with self._lock:
+                        self._abandoned += 1
+                    future.add_done_callback(self._release)
+                missed += 1
+                results.append(chunk)
+        if missed:
+            logger.warning("%d of %d translation chunks failed or timed out", missed, len(chunks))
+            degraded("translation_partial")
+        return results
+
+    def translate_batch(self, texts, target: str, timeout=None, retries=0):
+        """
+        Translates several texts concurrently, preserving order.
+
+        With a timeout, chunks that are not translated in time (or whose
+        backend call fails after `retries`) are returned untranslated.
+        """
+        # Flatten every text's chunks into one map so the pool is never
+        # waiting on itself
+        plan = []
+        for text in texts:
+            if detect_language(text) == target:
+                plan.append(None)
+            else:
+                plan.append(split_text(text, self.max_chunk_chars))
+        flat = [chunk for chunks in plan if chunks for chunk, _ in chunks]
+        if timeout is not None:
+            translated = iter(self._translate_within(flat, target, timeout, retries))
+        elif len(flat) == 1:
+            translated = iter([self._translate_chunk(flat[0], target, retries)])
+        else:
+            translated = self._executor.map(
+                lambda chunk: self._translate_chunk(chunk, target, retries), flat
+            )
+        results = []
+        for text, chunks in zip(texts, plan):
+            if chunks is None:
+                results.append(text)
+            else:
+                results.append("".join(next(translated) + space for _, space in chunks))
+        return results
+
+    def stats(self):
+        with self._lock:
+            abandoned = self._abandoned
+        return dict(self.cache.stats(), abandoned=abandoned)
+
+
+def service_from_env():
+    """Builds the service for TRANSLATION_BACKEND (google or dictionary)."""
+    if os.getenv("TRANSLATION_BACKEND", "google") == "dictionary":
+        return TranslationService(DictionaryBackend())
+    return TranslationService(GoogleBackend())
@@ -1,15 +1,11 @@
+import logging
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from bs4 import BeautifulSoup
-import time
-import json
-import urllib.parse
-import re
+from crawler import Crawler
+from crawl_state import IncrementalCrawler
 
 
 def setup_driver():
@@ -22,86 +18,44 @@ def setup_driver():
     )
 
 
-def get_page_content(driver, url):
+def get_page_content(driver, url, timeout=10):
     driver.get(url)
-    time.sleep(2)  # Wait for JavaScript to load
+    # Wait for JavaScript to finish loading instead of a fixed sleep
+    WebDriverWait(driver, timeout).until(
+        lambda d: d.execute_script("return document.readyState") == "complete"
+    )
     return driver.page_source
 
 
-def extract_links(soup, base_url):
-    links = []
-    for a in soup.find_all("a", href=True):
-        href = a["href"]
-        full_url = urllib.parse.urljoin(base_url, href)
-        if full_url.startswith(base_url) and not full_url.endswith(
-            (".pdf", ".jpg", ".png")
-        ):
-            links.append(full_url)
-    return list(set(links))  # Remove duplicates
-
-
-def clean_text(text):
-    # Remove non-printable and non-ASCII characters
-    text = re.sub(r"[^\x20-\x7E\s]", "", text)
-    # Replace multiple whitespace with a single space
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
-
-
-def crawl_website(base_url, output_file):
-    driver = setup_driver()
-    visited = set()
-    to_visit = [base_url]
-
-    with open(output_file, "w", encoding="utf-8") as file:
-        while to_visit:
-            url = to_visit.pop(0)
-            if url in visited:
-                continue
-
-            print(f"Visiting: {url}")
-            visited.add(url)
-
-            try:
-                content = get_page_content(driver, url)
-                soup = BeautifulSoup(content, "html.parser")
-
-                # Extract title and main content
-                title = clean_text(soup.title.string if soup.title else "No title")
-                main_content = clean_text(
-                    " ".join(
-                        [
-                            p.text
-                            for p in soup.find_all(
-                                ["p", "h1", "h2", "h3", "h4", "h5", "h6", "li"]
-                            )
-                        ]
-                    )
-                )
-
-                # Create a JSON object
-                data = {
-                    "URL": url,
-                    "Title": title,
-                    "Content": main_content,
-                }
-
-                # Write the JSON object as a single line in the JSONL file
-                json.dump(data, file, ensure_ascii=False)
-                file.write("\n")
-
-                # Find new links
-                new_links = extract_links(soup, base_url)
-                to_visit.extend([link for link in new_links if link not in visited])
+def crawl_website(
+    base_url, output_file, workers=8, per_host=4, browsers=1, state_file=None
+):
+    """
+    Crawls every page under base_url into a JSONL file.
 
-            except Exception as e:
-                print(f"Error crawling {url}: {e}")
+    Static pages are fetched concurrently over HTTP; only JavaScript-heavy
+    pages are rendered in headless Chrome. See crawler.Crawler.
 
-    driver.quit()
+    With state_file, the crawl is checkpointed and incremental: an
+    interrupted run resumes where it stopped, and unchanged pages are
+    skipped, so only new or changed records are appended to output_file.
+    See crawl_state.IncrementalCrawler.
+    """
+    options = dict(workers=workers, per_host=per_host, browsers=browsers)
+    if state_file is None:
+        crawler = Crawler(base_url, **options)
+    else:
+        crawler = IncrementalCrawler(base_url, state_file, **options)
+    stats = crawler.crawl(output_file)
+    print(f"Crawl stats: {stats}")
+    return stats
 
 
 if __name__ == "__main__":
+    # Shows the crawler's per-page progress
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
     base_url = "https://www.jventures.co.th/"
     output_file = "Data/jventures_crawl_results.jsonl"
-    crawl_website(base_url, output_file)
+    state_file = "Data/jventures_crawl_state.db"
+    crawl_website(base_url, output_file, state_file=state_file)
     print(f"Crawling completed. Data saved to {output_file}")
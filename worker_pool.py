@@ -0,0 +1,190 @@
+import os
+import threading
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Backpressure policies applied when the queue is full
+REJECT = "reject"
+DROP_OLDEST = "drop_oldest"
+BUSY = "busy"
+POLICIES = (REJECT, DROP_OLDEST, BUSY)
+
+
+class QueueFullError(Exception):
+    """Raised by submit() when the queue is full and the policy is 'reject'."""
+
+
+class Job:
+    __slots__ = ("fn", "args", "kwargs", "on_drop")
+
+    def __init__(self, fn, args, kwargs, on_drop=None):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.on_drop = on_drop
+
+
+class WorkerPool:
+    """
+    Bounded job queue served by a fixed number of daemon threads.
+
+    Args:
+        workers (int): Number of worker threads.
+        max_queue (int): Maximum number of jobs waiting to be picked up.
+        policy (str): What to do when the queue is full:
+            'reject'      - raise QueueFullError from submit().
+            'drop_oldest' - discard the oldest waiting job to make room.
+            'busy'        - do not enqueue; call the job's on_drop callback
+                            (used to reply "busy" to the user).
+        initializer (callable): Called with no arguments at the start of each
+            worker thread, e.g. to build per-thread state before the first job.
+    """
+
+    def __init__(self, workers=4, max_queue=100, policy=BUSY, initializer=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.workers = workers
+        self.max_queue = max_queue
+        self.policy = policy
+        self.initializer = initializer
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        # Separate from _cond so that submit()'s notify always wakes a worker
+        self._ready = threading.Condition()
+        self._threads = []
+        self._pid = None
+        self._in_flight = 0
+        self._initialized = 0
+        self._completed = 0
+        self._failed = 0
+        self._dropped = 0
+        self._rejected = 0
+
+    def _ensure_started(self):
+        # Threads do not survive fork(), so (re)start them in each process.
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._queue.clear()
+        self._in_flight = 0
+        self._initialized = 0
+        self._threads = []
+        for i in range(self.workers):
+            t = threading.Thread(
+                target=self._run, name=f"worker-pool-{i}", daemon=True
+            )
+            t.start()
+            self._threads.append(t)
+
+    def start(self, timeout=None):
+        """
+        Starts the worker threads now rather than on the first submit().
+
+        Returns:
+            bool: True once every thread has run the initializer, False if
+            they had not within timeout seconds.
+        """
+        with self._cond:
+            self._ensure_started()
+        with self._ready:
+            return self._ready.wait_for(lambda: self._initialized == self.workers, timeout)
+
+    def submit(self, fn, *args, on_drop=None, **kwargs):
+        """
+        Queue fn(*args, **kwargs) for execution on the pool.
+
+        Args:
+            fn (callable): The job to run.
+            on_drop (callable): Called with no arguments if the job is
+                discarded by the backpressure policy.
+        Returns:
+            bool: True if the job was queued, False if it was discarded.
+        """
+        job = Job(fn, args, kwargs, on_drop)
+        dropped = None
+        with self._cond:
+            self._ensure_started()
+            if len(self._queue) >= self.max_queue:
+                if self.policy == REJECT:
+                    self._rejected += 1
+                    raise QueueFullError(
+                        f"Job queue is full ({self.max_queue} jobs waiting)"
+                    )
+                if self.policy == DROP_OLDEST:
+                    dropped = self._queue.popleft()
+                    self._dropped += 1
+                else:
+                    self._rejected += 1
+                    dropped = job
+            if dropped is not job:
+                self._queue.append(job)
+                self._cond.notify()
+
+        if dropped is not None:
+            self._notify_dropped(dropped)
+        return dropped is not job
+
+    def _notify_dropped(self, job):
+        if job.on_drop is None:
+            return
+        try:
+            job.on_drop()
+        except Exception as e:
+            logger.error("Error in on_drop callback: %s", e)
+
+    def _run(self):
+        if self.initializer is not None:
+            try:
+                self.initializer()
+            except Exception as e:
+                logger.exception("Worker initializer failed: %s", e)
+        with self._ready:
+            self._initialized += 1
+            self._ready.notify_all()
+
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._queue.popleft()
+                self._in_flight += 1
+            try:
+                job.fn(*job.args, **job.kwargs)
+                failed = False
+            except Exception as e:
+                logger.exception("Job %r failed: %s", job.fn, e)
+                failed = True
+            with self._cond:
+                self._in_flight -= 1
+                if failed:
+                    self._failed += 1
+                else:
+                    self._completed += 1
+
+    def stats(self):
+        """Returns a snapshot of queue depth, in-flight and completion counts."""
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "policy": self.policy,
+                "queue_depth": len(self._queue),
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "failed": self._failed,
+                "dropped": self._dropped,
+                "rejected": self._rejected,
+            }
+
+
+def pool_from_env(prefix="WORKER_POOL", workers=4, max_queue=100, policy=BUSY, initializer=None):
+    """Builds a WorkerPool configured from <prefix>_SIZE/_QUEUE/_POLICY env vars."""
+    return WorkerPool(
+        workers=int(os.getenv(f"{prefix}_SIZE", str(workers))),
+        max_queue=int(os.getenv(f"{prefix}_QUEUE", str(max_queue))),
+        policy=os.getenv(f"{prefix}_POLICY", policy),
+        initializer=initializer,
+    )